@@ -0,0 +1,282 @@
+"""
+Elara Proxy - Admission control and load shedding
+Bounds in-flight work per worker and sheds excess requests with a fast 503
+
+Without admission control a traffic spike piles requests up behind busy
+threads until gunicorn's 60s timeout: clients get slow failures and /health
+still looks fine. Here every request is classified, then either admitted
+immediately, queued for a short class-specific wait, or rejected with
+503 + Retry-After in microseconds.
+
+Priority classes (highest first):
+- critical:   /health, /ready, /debug/*, CORS preflights - never queued or shed
+- navigation: /proxy and /validate - may use every in-flight slot
+- asset:      /resource - limited to a share of the slots so navigations keep headroom
+- background: prefetches (Sec-Purpose/Purpose: prefetch) and /validate/bulk
+
+A waiting request only takes a freed slot when no higher-priority request is
+waiting. The controller runs as WSGI middleware so slots are held until a
+streamed response body is fully sent, and shed requests never reach Flask.
+"""
+
+import math
+import time
+import json
+import logging
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+from werkzeug.wsgi import ClosingIterator
+
+logger = logging.getLogger(__name__)
+
+CRITICAL, NAVIGATION, ASSET, BACKGROUND = 'critical', 'navigation', 'asset', 'background'
+PRIORITY = {CRITICAL: 0, NAVIGATION: 1, ASSET: 2, BACKGROUND: 3}
+
+# Share of in-flight slots each class may fill
+DEFAULT_SHARES = {NAVIGATION: 1.0, ASSET: 0.75, BACKGROUND: 0.5}
+# Longest time a request of each class may wait for a slot before it is shed
+DEFAULT_MAX_WAIT = {NAVIGATION: 2.0, ASSET: 0.5, BACKGROUND: 0.0}
+
+CRITICAL_PATHS = ('/health', '/ready')
+CRITICAL_PREFIXES = ('/debug/',)
+BACKGROUND_PATHS = ('/validate/bulk',)
+ASSET_PATHS = ('/resource',)
+
+# Recent queue waits kept for percentiles and Retry-After
+WAIT_WINDOW = 10.0
+WAIT_SAMPLES = 2048
+# CoDel-style standing queue check: even the best-served request of the last
+# interval waited longer than the target
+STANDING_INTERVAL = 1.0
+# Time constant of the utilization moving average
+UTILIZATION_TAU = 5.0
+# Report not-ready above this average utilization so the orchestrator scales out early
+READY_UTILIZATION = 0.9
+
+
+def classify(environ: dict) -> str:
+    """Priority class of a WSGI request"""
+    path = environ.get('PATH_INFO', '')
+    if environ.get('REQUEST_METHOD') == 'OPTIONS' or path in CRITICAL_PATHS or path.startswith(CRITICAL_PREFIXES):
+        return CRITICAL
+    purpose = environ.get('HTTP_SEC_PURPOSE') or environ.get('HTTP_PURPOSE') or environ.get('HTTP_X_MOZ') or ''
+    if 'prefetch' in purpose.lower() or path in BACKGROUND_PATHS:
+        return BACKGROUND
+    if path in ASSET_PATHS:
+        return ASSET
+    return NAVIGATION
+
+
+class AdmissionController:
+    """Per-worker in-flight limiter with prioritised short queues"""
+
+    def __init__(self, max_in_flight: int = 8, queue_target: float = 0.1,
+                 shares: Optional[Dict[str, float]] = None,
+                 max_wait: Optional[Dict[str, float]] = None):
+        self.max_in_flight = max_in_flight
+        self.queue_target = queue_target
+        self.limits = {
+            cls: max(1, math.ceil(max_in_flight * share))
+            for cls, share in (shares or DEFAULT_SHARES).items()
+        }
+        self.max_wait = dict(max_wait or DEFAULT_MAX_WAIT)
+
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._class_in_flight = {cls: 0 for cls in PRIORITY}
+        self._waiting = {cls: 0 for cls in PRIORITY}
+        self.admitted = {cls: 0 for cls in PRIORITY}
+        self.shed = {cls: 0 for cls in PRIORITY}
+        self._waits = deque(maxlen=WAIT_SAMPLES)  # (timestamp, seconds waited)
+        self._utilization = 0.0
+        self._utilization_at = time.monotonic()
+
+    def _update_utilization(self, now: float):
+        # Time-weighted average of in_flight / max over the last few seconds
+        elapsed = now - self._utilization_at
+        if elapsed > 0:
+            alpha = 1 - math.exp(-elapsed / UTILIZATION_TAU)
+            self._utilization += alpha * (min(1.0, self.in_flight / self.max_in_flight) - self._utilization)
+            self._utilization_at = now
+
+    def _may_run(self, cls: str, queued: bool = False) -> bool:
+        """
+        A slot is free for this class and no higher-priority request is queued
+        New arrivals also yield to queued requests of their own class
+        """
+        if self.in_flight >= self.limits[cls]:
+            return False
+        priority = PRIORITY[cls]
+        for other, count in self._waiting.items():
+            if count and (PRIORITY[other] < priority or (other == cls and not queued)):
+                return False
+        return True
+
+    def _admit(self, cls: str, now: float):
+        self._update_utilization(now)
+        self.in_flight += 1
+        self._class_in_flight[cls] += 1
+        self.admitted[cls] += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def acquire(self, cls: str) -> bool:
+        """Take an in-flight slot for a request of this class; False means shed it"""
+        if cls == CRITICAL:
+            return True
+
+        started = time.monotonic()
+        with self._cond:
+            if self._may_run(cls):
+                self._admit(cls, started)
+                self._waits.append((started, 0.0))
+                return True
+
+            max_wait = self.max_wait.get(cls, 0.0)
+            # With a standing queue, waiting only delays the 503: only navigations still queue
+            if cls != NAVIGATION and self._standing_queue(started):
+                max_wait = 0.0
+            if max_wait <= 0:
+                self.shed[cls] += 1
+                return False
+
+            deadline = started + max_wait
+            self._waiting[cls] += 1
+            try:
+                while not self._may_run(cls, queued=True):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.shed[cls] += 1
+                        return False
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting[cls] -= 1
+
+            now = time.monotonic()
+            self._admit(cls, now)
+            self._waits.append((now, now - started))
+            # Lower-priority waiters may be able to run now that we've left the queue
+            self._cond.notify_all()
+            return True
+
+    def release(self, cls: str):
+        if cls == CRITICAL:
+            return
+        with self._cond:
+            self._update_utilization(time.monotonic())
+            self.in_flight -= 1
+            self._class_in_flight[cls] -= 1
+            self._cond.notify_all()
+
+    def _recent_waits(self, now: float):
+        cutoff = now - WAIT_WINDOW
+        return sorted(wait for at, wait in self._waits if at >= cutoff)
+
+    def _queue_wait(self, now: float, pct: float = 90) -> float:
+        waits = self._recent_waits(now)
+        if not waits:
+            return 0.0
+        return waits[min(len(waits) - 1, int(len(waits) * pct / 100))]
+
+    def _standing_queue(self, now: float) -> bool:
+        # Samples are in admission order, so scan back from the newest
+        cutoff = now - STANDING_INTERVAL
+        recent = False
+        for at, wait in reversed(self._waits):
+            if at < cutoff:
+                break
+            if wait <= self.queue_target:
+                return False
+            recent = True
+        # A burst that hasn't produced admissions yet is not a standing queue
+        return recent
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should back off (at least 1)"""
+        with self._cond:
+            return max(1, min(30, math.ceil(2 * self._queue_wait(time.monotonic()))))
+
+    def _ready(self, now: float) -> bool:
+        return not self._standing_queue(now) and self._utilization < READY_UTILIZATION
+
+    def ready(self) -> bool:
+        """Readiness: false while queues are standing or slots stay saturated"""
+        now = time.monotonic()
+        with self._cond:
+            self._update_utilization(now)
+            return self._ready(now)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._cond:
+            self._update_utilization(now)
+            p50 = self._queue_wait(now, 50)
+            p90 = self._queue_wait(now, 90)
+            return {
+                'ready': self._ready(now),
+                'standingQueue': self._standing_queue(now),
+                'inFlight': self.in_flight,
+                'peakInFlight': self.peak_in_flight,
+                'maxInFlight': self.max_in_flight,
+                'utilization': round(self._utilization, 3),
+                'queueWaitP50Ms': round(p50 * 1000, 2),
+                'queueWaitP90Ms': round(p90 * 1000, 2),
+                'queueTargetMs': round(self.queue_target * 1000, 2),
+                'classes': {
+                    cls: {
+                        'inFlight': self._class_in_flight[cls],
+                        'waiting': self._waiting[cls],
+                        'admitted': self.admitted[cls],
+                        'shed': self.shed[cls],
+                        'limit': self.limits.get(cls),
+                        'maxWaitMs': round(self.max_wait.get(cls, 0.0) * 1000)
+                    }
+                    for cls in PRIORITY if cls != CRITICAL
+                }
+            }
+
+
+class AdmissionMiddleware:
+    """WSGI middleware applying an AdmissionController to every request"""
+
+    def __init__(self, wsgi_app, controller: AdmissionController, headers: Optional[Dict[str, str]] = None):
+        self.wsgi_app = wsgi_app
+        self.controller = controller
+        self.headers = headers or {}
+
+    def _reject(self, cls: str, environ: dict, start_response):
+        retry_after = self.controller.retry_after()
+        logger.debug(f"[ADMISSION] Shed {cls} request {environ.get('PATH_INFO', '')} (retry after {retry_after}s)")
+        body = json.dumps({
+            'success': False,
+            'error': 'Service is overloaded, please retry',
+            'retryAfter': retry_after
+        }).encode()
+        start_response('503 Service Unavailable', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', str(retry_after)),
+            *self.headers.items()
+        ])
+        return [body]
+
+    def __call__(self, environ, start_response):
+        cls = classify(environ)
+        if not self.controller.acquire(cls):
+            return self._reject(cls, environ, start_response)
+
+        try:
+            result = self.wsgi_app(environ, start_response)
+        except BaseException:
+            self.controller.release(cls)
+            raise
+
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(result, file_wrapper):
+            # Keep the server's sendfile path intact; what's left is a kernel copy
+            self.controller.release(cls)
+            return result
+        # Hold the slot until a streamed body has been sent
+        return ClosingIterator(result, lambda: self.controller.release(cls))
@@ -5,6 +5,8 @@ Enterprise-grade browser isolation with DOM reconstruction
 
 import sys
 import os
+import time
+import math
 import json
 import base64
 import hashlib
@@ -23,7 +25,7 @@ logger.info("Starting Elara Enterprise Proxy Service...")
 logger.info(f"Python version: {sys.version}")
 
 try:
-    from flask import Flask, request, jsonify, Response, make_response
+    from flask import Flask, request, jsonify, Response, make_response, send_file, g
     logger.info("✓ Flask imported successfully")
 except ImportError as e:
     logger.error(f"Failed to import Flask: {e}")
@@ -76,8 +78,20 @@ import re
 import ipaddress
 import gzip
 import zlib
+import tempfile
 from urllib.parse import urlparse, urlunparse, urljoin, quote, unquote
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+from blob_store import BlobStore
+from transforms import TRANSFORM_VERSION, TransformPipeline, build_pipeline
+from upstream import TIMEOUT_ERRORS, RequestsUpstreamResponse, UpstreamResponse, create_transport, failure_kind
+from deadlines import DEADLINE_HEADER, Deadline, DeadlineExceeded, deadline_from_header, read_with_deadline
+from shm_rate_limit import default_path as default_rate_limit_path  # also registers shm://
+from optimize import VARY_HEADERS, AssetOptimizer, params_from_headers
+from bulk_validate import BulkValidator, iter_ndjson
+from admission import AdmissionController, AdmissionMiddleware
+from circuit_breaker import BreakerRegistry, NegativeCache, origin_of
 
 logger.info("All imports successful, initializing Flask app...")
 
@@ -94,15 +108,38 @@ CORS(app, resources={r"/*": {
 
 logger.info("Flask app initialized successfully")
 
+# Admission control: bound in-flight work per worker and shed the excess with a fast 503
+# (priority: /health > /proxy navigations > /resource assets > prefetch and bulk scans).
+# Run gunicorn with more threads than ADMISSION_MAX_IN_FLIGHT so excess requests reach
+# the controller and get shed instead of queueing inside gunicorn.
+ADMISSION_CONTROL = os.getenv('ADMISSION_CONTROL', 'true').lower() == 'true'
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv('ADMISSION_MAX_IN_FLIGHT', '8'))
+ADMISSION_QUEUE_TARGET = float(os.getenv('ADMISSION_QUEUE_TARGET_MS', '100')) / 1000
+admission: Optional[AdmissionController] = None
+if ADMISSION_CONTROL:
+    admission = AdmissionController(max_in_flight=ADMISSION_MAX_IN_FLIGHT, queue_target=ADMISSION_QUEUE_TARGET)
+    app.wsgi_app = AdmissionMiddleware(
+        app.wsgi_app, admission,
+        headers={'Access-Control-Allow-Origin': CORS_ORIGIN} if CORS_ORIGIN == '*' else None
+    )
+    logger.info(f"✓ Admission control enabled ({ADMISSION_MAX_IN_FLIGHT} in flight per worker)")
+
 # Rate Limiting (Production-grade DDoS protection)
+# Counters live in a shared-memory table so limits hold across all gunicorn workers on a node,
+# and the sliding window counter avoids the 2x burst fixed windows allow at window boundaries
+RATE_LIMIT_ENABLED = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+RATE_LIMIT_SHM_KEYS = int(os.getenv('RATE_LIMIT_SHM_KEYS', '65536'))
+RATE_LIMIT_STORAGE_URI = os.getenv('RATE_LIMIT_STORAGE_URI', f"shm://{default_rate_limit_path()}?keys={RATE_LIMIT_SHM_KEYS}")
+RATE_LIMIT_STRATEGY = os.getenv('RATE_LIMIT_STRATEGY', 'sliding-window-counter')
 limiter = Limiter(
     app=app,
+    enabled=RATE_LIMIT_ENABLED,
     key_func=get_remote_address,
     default_limits=["1000 per hour", "100 per minute"],
-    storage_uri="memory://",
-    strategy="fixed-window"
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy=RATE_LIMIT_STRATEGY
 )
-logger.info("✓ Rate limiting initialized (1000/hour, 100/min)")
+logger.info(f"✓ Rate limiting initialized (1000/hour, 100/min, {RATE_LIMIT_STRATEGY} via {RATE_LIMIT_STORAGE_URI})")
 
 # Caching (24-hour cache for proxied content)
 cache = Cache(app, config={
@@ -111,6 +148,19 @@ cache = Cache(app, config={
 })
 logger.info("✓ Caching initialized (24h TTL)")
 
+# Disk-backed blob store for /resource bodies (shared by all workers on a node)
+BLOB_STORE_ENABLED = os.getenv('BLOB_STORE_ENABLED', 'true').lower() == 'true'
+BLOB_STORE_DIR = os.getenv('BLOB_STORE_DIR', os.path.join(tempfile.gettempdir(), 'elara-blob-store'))
+BLOB_STORE_MAX_BYTES = int(os.getenv('BLOB_STORE_MAX_MB', '1024')) * 1024 * 1024
+
+blob_store: Optional[BlobStore] = None
+if BLOB_STORE_ENABLED:
+    try:
+        blob_store = BlobStore(BLOB_STORE_DIR, BLOB_STORE_MAX_BYTES, default_ttl=86400)
+        logger.info(f"✓ Blob store initialized at {BLOB_STORE_DIR} ({BLOB_STORE_MAX_BYTES // 1024 // 1024}MB budget)")
+    except Exception as e:
+        logger.error(f"Failed to initialize blob store, resource caching disabled: {e}")
+
 # JWT Secret (for authentication)
 JWT_SECRET = os.getenv('JWT_SECRET', 'elara-proxy-secret-change-in-production')
 JWT_ALGORITHM = 'HS256'
@@ -129,8 +179,65 @@ BLOCKED_IP_RANGES = [
 ]
 
 BLOCKED_DOMAINS = ['.local', '.internal', '.corp', '.localhost']
-REQUEST_TIMEOUT = 30
+IPV4_PATTERN = re.compile(r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$')
 MAX_RESPONSE_SIZE = 50 * 1024 * 1024  # 50MB for enterprise
+RESOURCE_CHUNK_SIZE = 64 * 1024  # Streaming chunk size for transformed resources
+
+# Optional bandwidth-saving stage for /resource (image downscale/re-encode, CSS/JS minification)
+ASSET_OPTIMIZATION = os.getenv('ASSET_OPTIMIZATION', 'false').lower() == 'true'
+OPTIMIZE_MIN_SAVINGS = float(os.getenv('OPTIMIZE_MIN_SAVINGS', '0.1'))  # Skip below 10% saving
+OPTIMIZE_MAX_IMAGE_WIDTH = int(os.getenv('OPTIMIZE_MAX_IMAGE_WIDTH', '1920'))
+OPTIMIZE_IMAGE_QUALITY = int(os.getenv('OPTIMIZE_IMAGE_QUALITY', '75'))
+OPTIMIZE_SAVE_DATA_QUALITY = int(os.getenv('OPTIMIZE_SAVE_DATA_QUALITY', '50'))
+
+# Bulk /validate for the scan pipeline (JSON array or NDJSON in, NDJSON out)
+BULK_VALIDATE_MAX_URLS = int(os.getenv('BULK_VALIDATE_MAX_URLS', '100000'))
+BULK_VALIDATE_BATCH = 2000  # Result lines per streamed chunk
+BULK_VALIDATE_MEMO_SIZE = int(os.getenv('BULK_VALIDATE_MEMO_SIZE', '65536'))  # Hosts
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+# Upstream timeouts: connect and time-to-first-byte budgets per fetch, bounded by
+# a total deadline per client request (clients may send a tighter one via DEADLINE_HEADER)
+CONNECT_TIMEOUT = float(os.getenv('UPSTREAM_CONNECT_TIMEOUT', '5'))
+TTFB_TIMEOUT = float(os.getenv('UPSTREAM_TTFB_TIMEOUT', '15'))
+REQUEST_DEADLINE = float(os.getenv('REQUEST_DEADLINE', '30'))
+
+# Upstream TLS verification: 'true' (system CAs), 'false', or the path of a CA bundle
+UPSTREAM_TLS_VERIFY = os.getenv('UPSTREAM_TLS_VERIFY', 'true')
+upstream_verify = {'true': True, 'false': False}.get(UPSTREAM_TLS_VERIFY.lower(), UPSTREAM_TLS_VERIFY)
+if upstream_verify is False:
+    logger.warning("UPSTREAM_TLS_VERIFY=false: upstream certificates are NOT verified")
+
+# Upstream transport for /resource asset fetches (HTTP/2 multiplexing and hedging are opt-in)
+UPSTREAM_HTTP2 = os.getenv('UPSTREAM_HTTP2', 'false').lower() == 'true'
+RESOURCE_HEDGING = os.getenv('RESOURCE_HEDGING', 'false').lower() == 'true'
+resource_transport = create_transport(UPSTREAM_HTTP2, timeout=REQUEST_DEADLINE, hedging=RESOURCE_HEDGING,
+                                      verify=upstream_verify)
+logger.info(f"✓ Resource upstream transport: {resource_transport.name}")
+
+asset_optimizer: Optional[AssetOptimizer] = None
+if ASSET_OPTIMIZATION:
+    asset_optimizer = AssetOptimizer(blob_store, min_savings=OPTIMIZE_MIN_SAVINGS)
+    logger.info(f"✓ Asset optimization enabled (min saving {OPTIMIZE_MIN_SAVINGS:.0%})")
+
+# Per-origin circuit breakers and short-TTL negative caches, so requests to origins that
+# are timing out or refusing connections fail fast instead of paying the full timeout again
+CIRCUIT_BREAKER_ENABLED = os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))  # Consecutive failures
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', '10'))  # Seconds before the first probe
+CIRCUIT_MAX_ORIGINS = int(os.getenv('CIRCUIT_MAX_ORIGINS', '10000'))  # Breakers kept per worker
+NEGATIVE_CACHE_TTL = float(os.getenv('NEGATIVE_CACHE_TTL', '5'))
+breakers: Optional[BreakerRegistry] = None
+if CIRCUIT_BREAKER_ENABLED:
+    breakers = BreakerRegistry(
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=CIRCUIT_RESET_TIMEOUT,
+        probe_timeout=REQUEST_DEADLINE,
+        max_origins=CIRCUIT_MAX_ORIGINS
+    )
+    logger.info(f"✓ Circuit breakers enabled (open after {CIRCUIT_FAILURE_THRESHOLD} failures)")
+failure_cache = NegativeCache(NEGATIVE_CACHE_TTL)  # url -> (error, status)
+blocked_cache = NegativeCache(NEGATIVE_CACHE_TTL)  # origin -> validate_url error
 
 # Enterprise-grade User-Agent (Chrome 131)
 BROWSER_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36'
@@ -232,7 +339,7 @@ def validate_url(url: str) -> Tuple[bool, str]:
             return False, "Access to localhost is not allowed"
 
         # Check IP ranges
-        if re.match(r'^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}$', hostname):
+        if IPV4_PATTERN.match(hostname):
             try:
                 ip = ipaddress.ip_address(hostname)
                 for blocked_range in BLOCKED_IP_RANGES:
@@ -248,6 +355,22 @@ def validate_url(url: str) -> Tuple[bool, str]:
         return False, f"Invalid URL format: {str(e)}"
 
 
+def validate_url_cached(url: str) -> Tuple[bool, str]:
+    """validate_url with blocked verdicts remembered per origin (the verdict depends only on it)"""
+    origin = origin_of(url)
+    cached = blocked_cache.get(origin)
+    if cached:
+        return False, cached[0]
+    is_valid, error_msg = validate_url(url)
+    if not is_valid:
+        blocked_cache.put(origin, error_msg)
+    return is_valid, error_msg
+
+
+# Per-host memoizing front end over normalize_url/validate_url for /validate/bulk
+bulk_validator = BulkValidator(normalize_url, validate_url, memo_size=BULK_VALIDATE_MEMO_SIZE)
+
+
 def get_proxy_url(original_url: str, session_token: str) -> str:
     """
     Generate proxy URL for resources
@@ -578,6 +701,208 @@ def log_audit(event_type: str, details: Dict, ip_address: str, user_id: str = No
     logger.info(f"[AUDIT] {event_type} | User: {user_id} | IP: {ip_address}")
 
 
+def resource_cache_key(resource_url: str) -> str:
+    """Blob store key for a /resource body (versioned by the transform stages)"""
+    return f"resource:v{TRANSFORM_VERSION}:{resource_url}"
+
+
+def parse_http_date(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds of an HTTP date header, None if missing or malformed"""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def resource_cache_ttl(headers, sent_cookies: bool) -> Optional[int]:
+    """
+    Seconds a /resource body may be kept in the shared blob store, None to skip it
+    Cache keys are URL-only, so anything that may differ per session or user is
+    never stored: bodies fetched with session cookies, responses setting cookies,
+    and private/no-store/no-cache responses. Freshness follows s-maxage/max-age,
+    then Expires, then the usual 10% of the Last-Modified age.
+    """
+    if not blob_store or sent_cookies or headers.get('set-cookie'):
+        return None
+
+    directives = {}
+    for directive in headers.get('cache-control', '').lower().split(','):
+        name, _, value = directive.strip().partition('=')
+        directives[name] = value.strip('" ')
+    if {'private', 'no-store', 'no-cache'} & directives.keys():
+        return None
+    vary = headers.get('vary', '').lower()
+    if '*' in vary or 'cookie' in vary or 'authorization' in vary:
+        return None
+
+    now = time.time()
+    date = parse_http_date(headers.get('date')) or now
+    ttl = None
+    for name in ('s-maxage', 'max-age'):
+        if directives.get(name, '').isdigit():
+            ttl = int(directives[name])
+            break
+    if ttl is None and 'expires' in headers:
+        # Invalid Expires values (e.g. "0") mean already expired
+        expires = parse_http_date(headers.get('expires'))
+        ttl = int(expires - date) if expires else 0
+    if ttl is None:
+        last_modified = parse_http_date(headers.get('last-modified'))
+        ttl = int((date - last_modified) / 10) if last_modified else blob_store.default_ttl
+    if headers.get('age', '').isdigit():
+        ttl -= int(headers['age'])
+
+    ttl = min(ttl, blob_store.default_ttl)
+    return ttl if ttl > 0 else None
+
+
+def stream_transformed_resource(response: UpstreamResponse, pipeline: TransformPipeline,
+                                resource_url: str, content_type: str, deadline: Deadline,
+                                cache_ttl: Optional[int]) -> Response:
+    """
+    Stream an upstream resource through its transform pipeline
+    The transformed body is cached in the blob store for cache_ttl seconds once fully streamed
+    Streaming stops (uncached) if the request deadline passes mid-body
+    """
+    # Transports can only stream-decode encodings they have decoders for (e.g. no zstd without zstandard)
+    content_encoding = response.headers.get('content-encoding', '').lower()
+    decodable = response.can_decode(content_encoding)
+    decode_content = pipeline.needs_decompressed
+
+    def generate():
+        cacheable = cache_ttl is not None and response.status_code == 200
+        chunks = []
+        size = 0
+        try:
+            if decode_content and not decodable:
+                # Fall back to buffered decompression for encodings the transport can't stream
+                raw = read_with_deadline(response.iter_bytes(RESOURCE_CHUNK_SIZE, decode_content=False,
+                                                             deadline=deadline), deadline)
+                body = decompress_content(raw, content_encoding)
+                upstream = [body[i:i + RESOURCE_CHUNK_SIZE] for i in range(0, len(body), RESOURCE_CHUNK_SIZE)]
+            else:
+                upstream = response.iter_bytes(RESOURCE_CHUNK_SIZE, decode_content=decode_content,
+                                               deadline=deadline)
+
+            for chunk in upstream:
+                out = pipeline.feed(chunk)
+                size += len(out)
+                if cacheable:
+                    if size <= MAX_RESPONSE_SIZE:
+                        chunks.append(out)
+                    else:
+                        cacheable = False
+                        chunks = []
+                if out:
+                    yield out
+
+            tail = pipeline.flush()
+            if cacheable:
+                chunks.append(tail)
+            if tail:
+                yield tail
+        except DeadlineExceeded:
+            logger.warning(f"[RESOURCE] Deadline exceeded while streaming {resource_url}, truncating")
+            return
+        finally:
+            response.close()
+
+        if cacheable:
+            try:
+                blob_store.put(resource_cache_key(resource_url), b''.join(chunks), content_type, ttl=cache_ttl)
+            except Exception as e:
+                logger.warning(f"[RESOURCE] Failed to cache transformed {resource_url}: {e}")
+
+    flask_response = Response(generate(), content_type=content_type)
+    if not decode_content and content_encoding:
+        flask_response.headers['Content-Encoding'] = content_encoding
+    flask_response.headers['Access-Control-Allow-Origin'] = '*'
+    flask_response.headers['X-Elara-Cache'] = 'MISS'
+    flask_response.headers['X-Elara-Transform'] = ','.join(pipeline.names)
+    return flask_response
+
+
+def optimized_resource_response(digest: str, content_type: str, load_source) -> Optional[Response]:
+    """
+    Serve the optimized variant of a resource for this client's hints
+    Returns None when the type isn't optimizable or the saving is below threshold
+    """
+    if not asset_optimizer or not asset_optimizer.handles(content_type):
+        return None
+
+    params = asset_optimizer.params_for(content_type, params_from_headers(
+        request.headers, OPTIMIZE_MAX_IMAGE_WIDTH, OPTIMIZE_IMAGE_QUALITY, OPTIMIZE_SAVE_DATA_QUALITY
+    ))
+    cached = asset_optimizer.lookup(digest, params)
+    if cached:
+        flask_response = send_file(cached[0], mimetype=cached[1], conditional=True)
+    elif asset_optimizer.is_skipped(digest, params):
+        return None
+    else:
+        result = asset_optimizer.optimize(load_source(), content_type, params, digest)
+        if not result:
+            return None
+        flask_response = make_response(result[0])
+        flask_response.headers['Content-Type'] = result[1]
+
+    flask_response.headers['X-Elara-Optimized'] = params.key
+    return flask_response
+
+
+def upstream_unavailable(url: str) -> Optional[Tuple[str, int, float, str]]:
+    """
+    (error, status, retry_after, reason) when url is known to be failing:
+    it failed within NEGATIVE_CACHE_TTL, or its origin's circuit is open
+    """
+    negative = failure_cache.get(url)
+    if negative:
+        (error, status), remaining = negative
+        return error, status, remaining, 'negative-cache'
+    if breakers:
+        wait = breakers.allow(origin_of(url))
+        if wait is not None:
+            return 'Origin is temporarily unavailable', 503, wait, 'circuit-open'
+    return None
+
+
+def fail_fast_response(body: dict, status: int, retry_after: float, reason: str) -> Response:
+    flask_response = make_response(jsonify(body), status)
+    flask_response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    flask_response.headers['X-Elara-Fail-Fast'] = reason
+    return flask_response
+
+
+def record_upstream_success(url: str):
+    if breakers:
+        breakers.record_success(origin_of(url))
+
+
+def record_upstream_failure(url: str, exc: Exception, error: str, status: int):
+    """Feed timeouts, SSL and connection errors into the negative cache and the origin's breaker"""
+    kind = failure_kind(exc)
+    if kind is None:
+        return
+    # A budget the client tightened says nothing about the origin's health
+    if isinstance(exc, DeadlineExceeded) and g.deadline.budget < REQUEST_DEADLINE:
+        return
+    failure_cache.put(url, (error, status))
+    if breakers:
+        breakers.record_failure(origin_of(url), kind)
+
+
+def read_file(path: str) -> bytes:
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@app.before_request
+def start_request_deadline():
+    """Start the total deadline for this request, honouring the client's remaining budget"""
+    g.deadline = deadline_from_header(request.headers.get(DEADLINE_HEADER), REQUEST_DEADLINE)
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -589,6 +914,62 @@ def health_check():
     }), 200
 
 
+@app.route('/ready', methods=['GET'])
+@limiter.exempt
+def readiness_check():
+    """Readiness: 503 while this worker is saturated so the orchestrator can scale out"""
+    if not admission:
+        return jsonify({'ready': True}), 200
+    stats = admission.stats()
+    return jsonify(stats), 200 if stats['ready'] else 503
+
+
+@app.route('/debug/admission', methods=['GET'])
+def admission_stats():
+    """In-flight work, queue wait and shed counts per priority class for debugging"""
+    if not admission:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, **admission.stats()}), 200
+
+
+@app.route('/debug/circuit-breakers', methods=['GET'])
+def circuit_breaker_stats():
+    """Per-origin breaker state and negative cache usage for debugging"""
+    stats = {'enabled': breakers is not None, **(breakers.stats() if breakers else {})}
+    stats['negativeCache'] = {
+        'ttlS': NEGATIVE_CACHE_TTL,
+        'failures': len(failure_cache),
+        'failureHits': failure_cache.hits,
+        'blockedVerdicts': len(blocked_cache),
+        'blockedHits': blocked_cache.hits
+    }
+    return jsonify(stats), 200
+
+
+@app.route('/debug/upstream', methods=['GET'])
+def upstream_stats():
+    """Upstream transport and per-connection stream counts for debugging"""
+    return jsonify(resource_transport.stats()), 200
+
+
+@app.route('/debug/blob-store', methods=['GET'])
+def blob_store_stats():
+    """Blob store usage for debugging"""
+    if not blob_store:
+        return jsonify({'enabled': False}), 200
+    return jsonify({'enabled': True, 'path': BLOB_STORE_DIR, **blob_store.stats()}), 200
+
+
+@app.route('/debug/rate-limit', methods=['GET'])
+def rate_limit_stats():
+    """Shared counter table size and live-counter evictions for debugging"""
+    if not RATE_LIMIT_ENABLED:
+        return jsonify({'enabled': False}), 200
+    storage = limiter.storage
+    stats = storage.stats() if hasattr(storage, 'stats') else {}
+    return jsonify({'enabled': True, 'storage': RATE_LIMIT_STORAGE_URI, **stats}), 200
+
+
 @app.route('/proxy', methods=['POST'])
 @limiter.limit("50 per minute")  # Stricter limit for main proxy endpoint
 def proxy_request():
@@ -623,7 +1004,7 @@ def proxy_request():
         logger.info(f"[{session_id}] Normalized: {original_url} -> {target_url}")
 
         # Validate URL
-        is_valid, error_msg = validate_url(target_url)
+        is_valid, error_msg = validate_url_cached(target_url)
         if not is_valid:
             logger.warning(f"[{session_id}] Blocked: {target_url} - {error_msg}")
             return jsonify({
@@ -632,6 +1013,13 @@ def proxy_request():
                 'blocked': True
             }), 403
 
+        # Fail fast for a URL or origin that is known to be down
+        unavailable = upstream_unavailable(target_url)
+        if unavailable:
+            error_msg, status, retry_after, reason = unavailable
+            logger.warning(f"[{session_id}] Failing fast ({reason}): {target_url}")
+            return fail_fast_response({'success': False, 'error': error_msg}, status, retry_after, reason)
+
         # Prepare headers
         request_headers = BROWSER_HEADERS.copy()
         parsed_target = urlparse(target_url)
@@ -643,25 +1031,30 @@ def proxy_request():
 
         logger.info(f"[{session_id}] Fetching: {target_url}")
 
-        # Make request
+        # Make request (phase timeouts, body read against the total deadline)
         with requests.Session() as session:
             session.headers.update(request_headers)
 
+            timeout = g.deadline.timeout(CONNECT_TIMEOUT, TTFB_TIMEOUT)
             response = session.get(
                 target_url,
-                timeout=REQUEST_TIMEOUT,
+                timeout=timeout,
                 allow_redirects=True,
-                verify=True,
-                cookies=cookies
+                verify=upstream_verify,
+                cookies=cookies,
+                stream=True
             )
+            record_upstream_success(target_url)
+
+            # Get raw content
+            body = RequestsUpstreamResponse(response, read_timeout=timeout[1])
+            content = read_with_deadline(body.iter_bytes(RESOURCE_CHUNK_SIZE, deadline=g.deadline),
+                                         g.deadline, MAX_RESPONSE_SIZE)
 
         # Store cookies from response
         if response.cookies:
             set_session_cookies(session_id, dict(response.cookies))
 
-        # Get raw content
-        content = response.content
-
         # CRITICAL: Explicitly decompress if content is compressed
         # Check Content-Encoding header and decompress manually
         content_encoding = response.headers.get('content-encoding', '').lower()
@@ -708,8 +1101,9 @@ def proxy_request():
             'contentType': content_type
         }), 200
 
-    except requests.exceptions.Timeout:
+    except requests.exceptions.Timeout as e:
         logger.error(f"[{session_id}] Timeout: {target_url}")
+        record_upstream_failure(target_url, e, 'Request timed out', 504)
         return jsonify({
             'success': False,
             'error': 'Request timed out'
@@ -717,6 +1111,7 @@ def proxy_request():
 
     except requests.exceptions.SSLError as e:
         logger.error(f"[{session_id}] SSL error: {e}")
+        record_upstream_failure(target_url, e, 'SSL certificate verification failed', 502)
         return jsonify({
             'success': False,
             'error': 'SSL certificate verification failed'
@@ -724,6 +1119,7 @@ def proxy_request():
 
     except requests.exceptions.ConnectionError as e:
         logger.error(f"[{session_id}] Connection error: {e}")
+        record_upstream_failure(target_url, e, 'Could not connect to the website', 502)
         return jsonify({
             'success': False,
             'error': 'Could not connect to the website'
@@ -756,48 +1152,112 @@ def proxy_resource():
         resource_url = unquote(resource_url)
 
         # Validate
-        is_valid, error_msg = validate_url(resource_url)
+        is_valid, error_msg = validate_url_cached(resource_url)
         if not is_valid:
             return jsonify({'error': error_msg}), 403
 
+        # Serve from the shared blob store (zero-copy via wsgi.file_wrapper/sendfile)
+        if blob_store:
+            cached = blob_store.get(resource_cache_key(resource_url))
+            flask_response = None
+            if cached:
+                blob_path, cached_type, _ = cached
+                try:
+                    # Blobs are named by their SHA-256 digest
+                    flask_response = optimized_resource_response(
+                        os.path.basename(blob_path), cached_type, lambda: read_file(blob_path)
+                    ) or send_file(blob_path, mimetype=cached_type, conditional=True)
+                except FileNotFoundError:
+                    # Another worker evicted the blob between lookup and open: refetch it
+                    logger.info(f"[RESOURCE] Cached blob for {resource_url} was evicted, refetching")
+            if flask_response is not None:
+                flask_response.headers['Access-Control-Allow-Origin'] = '*'
+                flask_response.headers['X-Elara-Cache'] = 'HIT'
+                if asset_optimizer and asset_optimizer.is_image(cached_type):
+                    flask_response.headers['Vary'] = VARY_HEADERS
+                return flask_response
+
+        # Fail fast for a URL or origin that is known to be down (e.g. a dead asset CDN)
+        unavailable = upstream_unavailable(resource_url)
+        if unavailable:
+            error_msg, status, retry_after, reason = unavailable
+            return fail_fast_response({'error': error_msg}, status, retry_after, reason)
+
         # Fetch resource
         request_headers = BROWSER_HEADERS.copy()
         cookies = get_session_cookies(session_id)
 
-        # CRITICAL: Don't use stream=True - let requests handle decompression automatically
-        response = requests.get(
+        # Stream so transformable types can be rewritten chunk by chunk;
+        # passthrough types are still read in full below
+        response = resource_transport.fetch(
             resource_url,
             headers=request_headers,
-            timeout=REQUEST_TIMEOUT,
             cookies=cookies,
-            allow_redirects=True,
-            verify=True
+            timeout=g.deadline.timeout(CONNECT_TIMEOUT, TTFB_TIMEOUT)
         )
+        record_upstream_success(resource_url)
+
+        content_type = response.headers.get('content-type', 'application/octet-stream')
+        content_encoding = response.headers.get('content-encoding', '').lower()
+        pipeline = build_pipeline(content_type, response.url)
+        cache_ttl = resource_cache_ttl(response.headers, bool(cookies))
+
+        if pipeline:
+            logger.info(f"[RESOURCE] Transforming {resource_url} with {pipeline.names}")
+            return stream_transformed_resource(response, pipeline, resource_url, content_type, g.deadline, cache_ttl)
 
         # Get raw content
-        content = response.content
+        try:
+            content = read_with_deadline(response.iter_bytes(RESOURCE_CHUNK_SIZE, deadline=g.deadline), g.deadline)
+        finally:
+            response.close()
 
         # CRITICAL: Explicitly decompress if content is compressed (same as /proxy endpoint)
-        content_encoding = response.headers.get('content-encoding', '').lower()
         if content_encoding:
             logger.info(f"[RESOURCE] Content-Encoding detected: {content_encoding} for {resource_url}")
             content = decompress_content(content, content_encoding)
             logger.info(f"[RESOURCE] Content decompressed: {len(content)} bytes")
 
+        # Cache shareable successful bodies on disk for every worker on this node
+        digest = None
+        cached = False
+        if cache_ttl is not None and response.status_code == 200 and len(content) <= MAX_RESPONSE_SIZE:
+            try:
+                digest = blob_store.put(resource_cache_key(resource_url), content, content_type, ttl=cache_ttl)
+                cached = True
+            except Exception as e:
+                logger.warning(f"[RESOURCE] Failed to cache {resource_url}: {e}")
+
+        # Optimized variant for this client, if worth it (content is now decompressed)
+        flask_response = None
+        if asset_optimizer and response.status_code == 200:
+            digest = digest or hashlib.sha256(content).hexdigest()
+            flask_response = optimized_resource_response(digest, content_type, lambda: content)
+
         # Create Flask response (content is now decompressed)
-        flask_response = make_response(content)
+        if flask_response is None:
+            flask_response = make_response(content)
 
-        # Copy relevant headers
-        content_type = response.headers.get('content-type', 'application/octet-stream')
-        flask_response.headers['Content-Type'] = content_type
+            # Copy relevant headers
+            flask_response.headers['Content-Type'] = content_type
 
         # Add CORS headers
         flask_response.headers['Access-Control-Allow-Origin'] = '*'
+        if cached:
+            flask_response.headers['X-Elara-Cache'] = 'MISS'
+        if asset_optimizer and asset_optimizer.is_image(content_type):
+            flask_response.headers['Vary'] = VARY_HEADERS
 
         return flask_response
 
+    except TIMEOUT_ERRORS as e:
+        logger.error(f"Resource timeout: {e}")
+        record_upstream_failure(resource_url, e, 'Resource fetch timed out', 504)
+        return jsonify({'error': 'Resource fetch timed out'}), 504
+
     except Exception as e:
         logger.error(f"Resource proxy error: {e}")
+        record_upstream_failure(resource_url, e, 'Failed to fetch resource', 500)
         return jsonify({'error': 'Failed to fetch resource'}), 500
 
 
@@ -818,7 +1278,7 @@ def validate_url_endpoint():
 
         logger.info(f"Validating: {original_url} -> {normalized_url}")
 
-        is_valid, error_msg = validate_url(normalized_url)
+        is_valid, error_msg = validate_url_cached(normalized_url)
 
         if is_valid:
             return jsonify({
@@ -844,6 +1304,71 @@ def validate_url_endpoint():
         }), 500
 
 
+def read_bulk_entries() -> Optional[list]:
+    """
+    Entries of a bulk request: NDJSON (read incrementally) or a JSON array / {"urls": [...]}
+    Returns None for a malformed body; stops reading past BULK_VALIDATE_MAX_URLS
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        chunks = iter(lambda: request.stream.read(RESOURCE_CHUNK_SIZE), b'')
+        entries = []
+        for entry in iter_ndjson(chunks):
+            entries.append(entry)
+            if len(entries) > BULK_VALIDATE_MAX_URLS:
+                break
+        return entries
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('urls')
+    return data if isinstance(data, list) else None
+
+
+@app.route('/validate/bulk', methods=['POST'])
+@limiter.limit("20 per minute")  # Each request carries up to BULK_VALIDATE_MAX_URLS URLs
+def validate_bulk_endpoint():
+    """
+    Validate many URLs in one request
+    Results stream back as NDJSON in input order, one line per entry with its index
+    """
+    try:
+        # The whole body is read before responding: clients that finish sending
+        # before they start reading would otherwise deadlock on large lists
+        entries = read_bulk_entries()
+    except Exception as e:
+        logger.error(f"[BULK] Failed to read request body: {e}")
+        entries = None
+
+    if entries is None:
+        return jsonify({
+            'success': False,
+            'error': 'Expected a JSON array of URLs, {"urls": [...]}, or an NDJSON body'
+        }), 400
+
+    if len(entries) > BULK_VALIDATE_MAX_URLS:
+        return jsonify({
+            'success': False,
+            'error': f'Too many URLs (max {BULK_VALIDATE_MAX_URLS} per request)'
+        }), 413
+
+    def generate():
+        started = time.perf_counter()
+        for start in range(0, len(entries), BULK_VALIDATE_BATCH):
+            yield bulk_validator.validate_batch(entries[start:start + BULK_VALIDATE_BATCH], start)
+        elapsed = time.perf_counter() - started
+        logger.info(f"[BULK] Validated {len(entries)} URLs in {elapsed * 1000:.1f}ms")
+
+    flask_response = Response(generate(), mimetype='application/x-ndjson')
+    flask_response.headers['X-Elara-Bulk-Count'] = str(len(entries))
+    return flask_response
+
+
+@app.route('/debug/bulk-validate', methods=['GET'])
+def bulk_validate_stats():
+    """Per-host memo usage of the bulk validator for debugging"""
+    return jsonify(bulk_validator.stats()), 200
+
+
 @app.route('/', methods=['GET'])
 def root():
     """Root endpoint"""
@@ -861,9 +1386,11 @@ def root():
         ],
         'endpoints': {
             'health': '/health',
+            'ready': '/ready',
             'proxy': '/proxy (POST)',
             'resource': '/resource (GET)',
-            'validate': '/validate (POST)'
+            'validate': '/validate (POST)',
+            'validateBulk': '/validate/bulk (POST, JSON array or NDJSON)'
         }
     }), 200
 
@@ -0,0 +1,187 @@
+"""
+Elara Proxy - Disk-backed blob store
+Content-addressed on-disk cache for large proxied resources (images, fonts, JS)
+
+Blobs live on the local filesystem keyed by their SHA-256 digest, so every
+gunicorn worker on a node shares a single copy of each asset and the kernel
+page cache does the heavy lifting. The index is a SQLite database next to the
+blobs, which survives restarts and is safe to use from several processes.
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Only refresh last-access times this often to avoid a write on every hit
+ACCESS_UPDATE_INTERVAL = 60
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    digest TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_blobs_last_access ON blobs (last_access);
+CREATE INDEX IF NOT EXISTS idx_entries_digest ON entries (digest);
+'''
+
+
+class BlobStore:
+    """
+    Content-addressed blob store with a disk budget and LRU eviction
+
+    Layout:
+        <root>/index.db            SQLite index (entries + blobs)
+        <root>/blobs/ab/abcdef...  blob bodies, named by SHA-256 digest
+    """
+
+    def __init__(self, root: str, max_bytes: int, default_ttl: int = 86400):
+        self.root = root
+        self.blob_dir = os.path.join(root, 'blobs')
+        self.index_path = os.path.join(root, 'index.db')
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._local = threading.local()
+
+        os.makedirs(self.blob_dir, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Get the SQLite connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def blob_path(self, digest: str) -> str:
+        """Filesystem path for a blob digest"""
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def get(self, key: str) -> Optional[Tuple[str, str, int]]:
+        """
+        Look up a cached resource
+        Returns (path, content_type, size) or None on miss/expiry
+        """
+        conn = self._connect()
+        row = conn.execute(
+            'SELECT e.digest, e.content_type, e.expires_at, b.size, b.last_access '
+            'FROM entries e JOIN blobs b ON b.digest = e.digest WHERE e.key = ?',
+            (key,)
+        ).fetchone()
+        if not row:
+            return None
+
+        digest, content_type, expires_at, size, last_access = row
+        now = time.time()
+
+        if expires_at < now:
+            conn.execute('DELETE FROM entries WHERE key = ?', (key,))
+            return None
+
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            # Blob was removed behind our back (manual cleanup, another worker)
+            logger.warning(f"[BLOB] Missing blob file for {digest}, dropping index rows")
+            self._drop_blob(conn, digest)
+            return None
+
+        if now - last_access > ACCESS_UPDATE_INTERVAL:
+            conn.execute('UPDATE blobs SET last_access = ? WHERE digest = ?', (now, digest))
+
+        return path, content_type, size
+
+    def put(self, key: str, content: bytes, content_type: str, ttl: Optional[int] = None) -> str:
+        """Store content under key and return its digest"""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.blob_path(digest)
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.default_ttl)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file in the same directory, then atomically rename
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                raise
+
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO blobs (digest, size, last_access) VALUES (?, ?, ?) '
+                'ON CONFLICT(digest) DO UPDATE SET last_access = excluded.last_access',
+                (digest, len(content), now)
+            )
+            conn.execute(
+                'INSERT OR REPLACE INTO entries (key, digest, content_type, expires_at) '
+                'VALUES (?, ?, ?, ?)',
+                (key, digest, content_type, expires_at)
+            )
+            self._evict(conn)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        return digest
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Evict least-recently-used blobs until the store fits its budget"""
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM blobs').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for digest, size in conn.execute(
+            'SELECT digest, size FROM blobs ORDER BY last_access ASC'
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._drop_blob(conn, digest)
+            total -= size
+            logger.info(f"[BLOB] Evicted {digest} ({size} bytes)")
+
+    def _drop_blob(self, conn: sqlite3.Connection, digest: str):
+        """Remove a blob and every entry pointing at it"""
+        conn.execute('DELETE FROM entries WHERE digest = ?', (digest,))
+        conn.execute('DELETE FROM blobs WHERE digest = ?', (digest,))
+        try:
+            os.unlink(self.blob_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> dict:
+        """Current store usage"""
+        conn = self._connect()
+        blob_count, total = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs'
+        ).fetchone()
+        entry_count = conn.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        return {
+            'blobs': blob_count,
+            'entries': entry_count,
+            'bytes': total,
+            'maxBytes': self.max_bytes
+        }
@@ -0,0 +1,150 @@
+"""
+Elara Proxy - Bulk URL validation
+Normalizes and validates large URL lists for the scan pipeline
+
+Per-URL work is dominated by urlparse/urlunparse, yet scan lists repeat the
+same few hosts thousands of times. Each URL is split with one precompiled
+regex into scheme, netloc and tail; the normalized scheme://host prefix and
+the security verdict depend only on (scheme, netloc), so they are computed
+once per host by the regular normalize_url/validate_url and memoized. The
+tail is appended verbatim when urlparse would round-trip it unchanged;
+anything unusual falls back to the full per-URL path, so results are always
+identical to POST /validate.
+
+Output lines are assembled from pre-encoded JSON fragments rather than
+json.dumps per item.
+"""
+
+import re
+import json
+import logging
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# scheme (only the exact prefixes normalize_url recognises), netloc, tail
+URL_PARTS = re.compile(r'(https?://)?([^/?#]*)(.*)', re.DOTALL)
+# Netlocs that urlsplit would alter (stripped/unsafe characters) take the slow path,
+# as do empty ones (urlunsplit then re-reads a '//' path as the authority)
+SAFE_NETLOC = re.compile(r'[^\s\x00-\x1f\x7f]+')
+# Tails that urlparse/urlunparse return unchanged: no whitespace or control
+# characters (stripped), no ';' (path params), no empty query or fragment
+SAFE_TAIL = re.compile(r'(?![^#]*\?#)[^\s;\x00-\x1f\x7f]*(?<![?#])')
+
+FAILED = ',"success":false,"error":"Failed to validate URL"'
+INVALID_ENTRY = ',"success":false,"error":"Invalid entry: expected a URL string or {\\"url\\": ...}"'
+
+# Memoized per host: (normalized prefix without the trailing '/', verdict fragment)
+HostResult = Tuple[Optional[str], str]
+
+
+def verdict_fragment(is_valid: bool, error: str) -> str:
+    if is_valid:
+        return ',"success":true,"valid":true'
+    return f',"success":true,"valid":false,"error":{encode_basestring_ascii(error)}'
+
+
+def entry_url(entry) -> Optional[str]:
+    """URL from a bulk entry: a string or an object with a "url" field"""
+    if isinstance(entry, str):
+        return entry
+    if isinstance(entry, dict) and isinstance(entry.get('url'), str):
+        return entry['url']
+    return None
+
+
+def parse_ndjson_line(line: bytes):
+    """One NDJSON entry; bare (unquoted) URLs are accepted as well"""
+    first = line[:1]
+    if first == b'"' or first == b'{':
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+    return line.decode('utf-8', errors='replace')
+
+
+def iter_ndjson(chunks: Iterable[bytes]) -> Iterator:
+    """Entries of an NDJSON body read chunk by chunk; blank lines are skipped"""
+    pending = b''
+    for chunk in chunks:
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield parse_ndjson_line(line)
+    pending = pending.strip()
+    if pending:
+        yield parse_ndjson_line(pending)
+
+
+class BulkValidator:
+    """Memoizing batch front end for normalize_url/validate_url"""
+
+    def __init__(self, normalize: Callable[[str], str], validate: Callable[[str], Tuple[bool, str]],
+                 memo_size: int = 65536):
+        self._normalize = normalize
+        self._validate = validate
+        self._host = lru_cache(maxsize=memo_size)(self._resolve_host)
+
+    def _resolve_host(self, scheme: str, netloc: str) -> HostResult:
+        try:
+            normalized = self._normalize(scheme + netloc)
+            return normalized[:-1], verdict_fragment(*self._validate(normalized))
+        except Exception as e:
+            logger.debug(f"[BULK] Failed to validate host {netloc!r}: {e}")
+            return None, FAILED
+
+    def _resolve_url(self, url: str) -> HostResult:
+        """Full per-URL path, identical to POST /validate"""
+        try:
+            normalized = self._normalize(url)
+            return normalized, verdict_fragment(*self._validate(normalized))
+        except Exception as e:
+            logger.debug(f"[BULK] Failed to validate {url!r}: {e}")
+            return None, FAILED
+
+    def validate_batch(self, entries: List, start: int = 0) -> str:
+        """NDJSON result lines for entries, indexed from start, in input order"""
+        host = self._host
+        url_parts = URL_PARTS.match
+        safe_netloc = SAFE_NETLOC.fullmatch
+        safe_tail = SAFE_TAIL.fullmatch
+        out = []
+        append = out.append
+
+        for index, entry in enumerate(entries, start):
+            original = entry if isinstance(entry, str) else entry_url(entry)
+            if original is None:
+                append(f'{{"index":{index}{INVALID_ENTRY}}}\n')
+                continue
+
+            url = original.strip()
+            scheme, netloc, tail = url_parts(url).groups()
+            if safe_netloc(netloc) and safe_tail(tail):
+                prefix, verdict = host(scheme or 'https://', netloc)
+                if prefix is not None:
+                    normalized = prefix + (tail if tail[:1] == '/' else '/' + tail)
+            else:
+                normalized, verdict = self._resolve_url(url)
+                prefix = normalized
+
+            if prefix is None:
+                append(f'{{"index":{index}{verdict},"originalUrl":{encode_basestring_ascii(original)}}}\n')
+            else:
+                append(f'{{"index":{index}{verdict},"url":{encode_basestring_ascii(normalized)},'
+                       f'"originalUrl":{encode_basestring_ascii(original)}}}\n')
+
+        return ''.join(out)
+
+    def stats(self) -> dict:
+        info = self._host.cache_info()
+        return {
+            'hosts': info.currsize,
+            'hits': info.hits,
+            'misses': info.misses,
+            'maxHosts': info.maxsize
+        }
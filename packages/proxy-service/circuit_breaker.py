@@ -0,0 +1,226 @@
+"""
+Elara Proxy - Per-origin circuit breakers and negative caches
+Fail fast for origins that are down instead of paying the full timeout again
+
+Each origin (scheme://host:port) gets a breaker:
+- closed:    requests flow; consecutive timeouts/SSL/connection failures are counted
+- open:      after `failure_threshold` failures requests are rejected immediately
+             for `reset_timeout` seconds (doubling on every failed probe, capped)
+- half-open: once that passes a single probe request is let through; success
+             closes the breaker, failure re-opens it
+
+Alongside the breakers, two short-TTL negative caches answer repeat requests
+without touching the network: recent failures per URL (so a page's dead asset
+isn't re-fetched by every request while the breaker is still counting) and
+blocked validate_url verdicts per origin.
+
+State is per worker process. Origins are attacker-influenced (any page can
+reference random subdomains of a dead host), so the registry is bounded: idle
+breakers are forgotten whatever their state, and past `max_origins` the least
+recently used one is evicted.
+"""
+
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+ORIGIN_PATTERN = re.compile(r'^([a-zA-Z][a-zA-Z0-9+.-]*://[^/?#]*)')
+
+# Breakers for origins that haven't been requested for this long are forgotten
+IDLE_BREAKER_TTL = 600
+PRUNE_INTERVAL = 60
+
+
+def origin_of(url: str) -> str:
+    """scheme://netloc of a URL without a full urlparse"""
+    match = ORIGIN_PATTERN.match(url)
+    return match.group(1).lower() if match else url
+
+
+class NegativeCache:
+    """Bounded TTL map (oldest entries evicted first)"""
+
+    def __init__(self, ttl: float, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, seconds left) while the entry is fresh"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                del self._entries[key]
+                return None
+            self.hits += 1
+            return value, remaining
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CircuitBreaker:
+    """Breaker state for one origin; guarded by the registry's lock"""
+
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.last_failure: Optional[str] = None
+        self.opened_at = 0.0
+        self.open_for = 0.0
+        self.probe_started: Optional[float] = None
+        self.rejected = 0
+        self.touched = time.monotonic()
+
+
+class BreakerRegistry:
+    """Circuit breakers for every origin this worker talks to"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10,
+                 max_reset_timeout: float = 120, probe_timeout: float = 30,
+                 max_origins: int = 10000):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.probe_timeout = probe_timeout
+        self.max_origins = max_origins
+        # Least recently touched first
+        self._breakers: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._pruned_at = time.monotonic()
+        self.evicted = 0
+
+    def _touch(self, origin: str, breaker: CircuitBreaker, now: float):
+        breaker.touched = now
+        self._breakers.move_to_end(origin)
+
+    def allow(self, origin: str) -> Optional[float]:
+        """
+        None if a request to origin may proceed, else seconds until the next probe
+        In half-open state exactly one caller (the probe) is let through
+        """
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._breakers.get(origin)
+            if breaker is None or breaker.state == CLOSED:
+                return None
+
+            # Still being requested: not idle
+            self._touch(origin, breaker, now)
+            if breaker.state == OPEN:
+                wait = breaker.opened_at + breaker.open_for - now
+                if wait > 0:
+                    breaker.rejected += 1
+                    return wait
+                breaker.state = HALF_OPEN
+                breaker.probe_started = None
+
+            # Half-open: one probe at a time (a lost probe is replaced after probe_timeout)
+            if breaker.probe_started is None or now - breaker.probe_started > self.probe_timeout:
+                breaker.probe_started = now
+                logger.info(f"[BREAKER] Probing {origin}")
+                return None
+            breaker.rejected += 1
+            return max(1.0, self.probe_timeout - (now - breaker.probe_started))
+
+    def record_success(self, origin: str):
+        with self._lock:
+            breaker = self._breakers.get(origin)
+            if breaker is None:
+                return
+            if breaker.state != CLOSED:
+                logger.info(f"[BREAKER] {origin} recovered, closing circuit")
+            breaker.state = CLOSED
+            breaker.failures = 0
+            breaker.open_for = 0.0
+            breaker.probe_started = None
+            self._touch(origin, breaker, time.monotonic())
+
+    def record_failure(self, origin: str, kind: str):
+        now = time.monotonic()
+        with self._lock:
+            breaker = self._breakers.get(origin)
+            if breaker is None:
+                self._prune(now)
+                while len(self._breakers) >= self.max_origins:
+                    self._breakers.popitem(last=False)
+                    self.evicted += 1
+                breaker = self._breakers[origin] = CircuitBreaker()
+            breaker.failures += 1
+            breaker.last_failure = kind
+            self._touch(origin, breaker, now)
+
+            if breaker.state == HALF_OPEN:
+                # Failed probe: back off exponentially
+                breaker.open_for = min(self.max_reset_timeout, max(self.reset_timeout, breaker.open_for * 2))
+            elif breaker.state == CLOSED and breaker.failures >= self.failure_threshold:
+                breaker.open_for = self.reset_timeout
+            else:
+                return
+
+            breaker.state = OPEN
+            breaker.opened_at = now
+            breaker.probe_started = None
+            logger.warning(f"[BREAKER] Opened circuit for {origin} after {breaker.failures} failures "
+                           f"({kind}), next probe in {breaker.open_for:.1f}s")
+
+    def _prune(self, now: float):
+        """Forget breakers (open ones included) for origins nobody has requested for a while"""
+        if now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        while self._breakers:
+            origin, breaker = next(iter(self._breakers.items()))
+            if now - breaker.touched <= IDLE_BREAKER_TTL:
+                break
+            del self._breakers[origin]
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            origins = {}
+            for origin, breaker in self._breakers.items():
+                next_probe = None
+                if breaker.state == OPEN:
+                    next_probe = round(max(0.0, breaker.opened_at + breaker.open_for - now), 1)
+                origins[origin] = {
+                    'state': breaker.state,
+                    'failures': breaker.failures,
+                    'lastFailure': breaker.last_failure,
+                    'rejected': breaker.rejected,
+                    'nextProbeS': next_probe,
+                    'probeInFlight': breaker.state == HALF_OPEN and breaker.probe_started is not None
+                }
+        return {
+            'failureThreshold': self.failure_threshold,
+            'resetTimeoutS': self.reset_timeout,
+            'open': sum(1 for o in origins.values() if o['state'] != CLOSED),
+            'tracked': len(origins),
+            'maxOrigins': self.max_origins,
+            'evicted': self.evicted,
+            'origins': origins
+        }
@@ -0,0 +1,79 @@
+"""
+Elara Proxy - Request deadlines
+Phase-aware upstream timeouts bounded by the client's remaining deadline
+
+Every upstream fetch gets separate connect and time-to-first-byte budgets
+(requests' (connect, read) timeout tuple; the read timeout also bounds the gap
+between body reads), and the body is read against a total deadline so a
+trickling origin cannot hold a worker indefinitely. The transports clip every
+blocking socket read to the time left, so the deadline holds mid-read too.
+"""
+
+import time
+from typing import Iterable, Optional, Tuple
+
+import requests
+
+# Remaining client budget in milliseconds, sent by the caller
+DEADLINE_HEADER = 'X-Elara-Deadline-Ms'
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """The request's total deadline ran out (handled like any upstream timeout)"""
+
+
+class Deadline:
+    """Absolute deadline for one client request"""
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self):
+        if self.expired():
+            raise DeadlineExceeded(f"Request deadline of {self.budget:.1f}s exceeded")
+
+    def timeout(self, connect: float, ttfb: float) -> Tuple[float, float]:
+        """(connect, read) timeout tuple clipped to the remaining deadline"""
+        self.check()
+        remaining = self.remaining()
+        return min(connect, remaining), min(ttfb, remaining)
+
+    def read_timeout(self, gap: float) -> float:
+        """Timeout for the next blocking body read: the inter-read gap clipped to the deadline"""
+        self.check()
+        return min(gap, self.remaining())
+
+
+def deadline_from_header(value: Optional[str], default_budget: float) -> Deadline:
+    """Deadline from the client's remaining-budget header, never above our own budget"""
+    budget = default_budget
+    if value:
+        try:
+            budget = min(default_budget, max(0.0, float(value) / 1000))
+        except ValueError:
+            pass
+    return Deadline(budget)
+
+
+def read_with_deadline(chunks: Iterable[bytes], deadline: Deadline,
+                       max_size: Optional[int] = None) -> bytes:
+    """
+    Join body chunks, failing once the deadline passes or the body exceeds max_size
+    Pass chunks from iter_bytes(..., deadline=deadline) so a blocked read can't outlive it
+    """
+    parts = []
+    size = 0
+    for chunk in chunks:
+        parts.append(chunk)
+        size += len(chunk)
+        if max_size is not None and size > max_size:
+            break
+        deadline.check()
+    return b''.join(parts)
@@ -0,0 +1,292 @@
+"""
+Elara Proxy Load Test - Load driver and metrics
+Drives /proxy, /resource and /validate at a target concurrency
+"""
+
+import os
+import time
+import random
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import requests
+
+from loadtest.origin import ORIGIN_HOST
+
+logger = logging.getLogger(__name__)
+
+# Relative weights of each endpoint in the traffic mix
+DEFAULT_MIX = {'/proxy': 1, '/resource': 6, '/validate': 3}
+
+PAGE_VARIANTS = [
+    'size=50000&encoding=gzip&subresources=10',
+    'size=200000&encoding=br&subresources=30',
+    'size=20000&encoding=identity&chunked=1&charset=iso-8859-1',
+    'size=80000&encoding=zstd&subresources=5',
+    'size=10000&drip=5',
+]
+
+REDIRECT_VARIANTS = [
+    'hops=3&to=/page?size=30000',
+]
+
+ASSET_VARIANTS = [
+    'style{i}.css?size=4096',
+    'style{i}.css?size=32768&encoding=gzip',
+    'app{i}.js?size=16384&encoding=br',
+    'icon{i}.svg?size=2048',
+    'img{i}.png?size=32768',
+    'font{i}.woff2?size=65536',
+]
+
+# What the isolation iframe sends for subresources (used by the optimization stage)
+RESOURCE_HEADERS = {
+    'Accept': 'image/avif,image/webp,image/apng,*/*;q=0.8',
+    'Sec-CH-Viewport-Width': '1280',
+    'Sec-CH-DPR': '1',
+}
+
+VALIDATE_VARIANTS = [
+    'example.com',
+    'google.com',
+    'https://cdn.example.org/assets/app.js',
+    'http://localhost:8080/admin',
+    'http://10.0.0.1/',
+    'https://intranet.corp/login',
+    'news.ycombinator.com/item?id=1',
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+class Metrics:
+    """
+    Thread-safe latency/status collector per endpoint
+    Load-shed responses (503 + Retry-After) are counted apart from errors;
+    fail-fast 503s (X-Elara-Fail-Fast) for a failing upstream are errors
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+        self.shed: Dict[str, int] = {}
+        self.bytes: Dict[str, int] = {}
+
+    def record(self, endpoint: str, latency: float, status: Optional[int], size: int = 0,
+               shed: bool = False):
+        ok = shed or (status is not None and 200 <= status < 400)
+        with self._lock:
+            if shed:
+                self.shed[endpoint] = self.shed.get(endpoint, 0) + 1
+            self.latencies.setdefault(endpoint, []).append(latency)
+            self.bytes[endpoint] = self.bytes.get(endpoint, 0) + size
+            statuses = self.statuses.setdefault(endpoint, {})
+            key = str(status) if status is not None else 'exception'
+            statuses[key] = statuses.get(key, 0) + 1
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def summary(self, elapsed: float) -> dict:
+        """Per-endpoint and overall RPS, latency percentiles (ms) and error rate"""
+        endpoints = {}
+        total = 0
+        total_errors = 0
+        total_shed = 0
+        with self._lock:
+            for endpoint, values in self.latencies.items():
+                values = sorted(values)
+                errors = self.errors.get(endpoint, 0)
+                shed = self.shed.get(endpoint, 0)
+                total += len(values)
+                total_errors += errors
+                total_shed += shed
+                endpoints[endpoint] = {
+                    'requests': len(values),
+                    'rps': round(len(values) / elapsed, 2),
+                    'p50_ms': round(percentile(values, 50) * 1000, 2),
+                    'p90_ms': round(percentile(values, 90) * 1000, 2),
+                    'p99_ms': round(percentile(values, 99) * 1000, 2),
+                    'max_ms': round(values[-1] * 1000, 2),
+                    'error_rate': round(errors / len(values), 4),
+                    'shed_rate': round(shed / len(values), 4),
+                    'bytes': self.bytes.get(endpoint, 0),
+                    'avg_bytes': round(self.bytes.get(endpoint, 0) / len(values)),
+                    'statuses': dict(self.statuses.get(endpoint, {}))
+                }
+        return {
+            'elapsed_s': round(elapsed, 2),
+            'requests': total,
+            'rps': round(total / elapsed, 2) if elapsed else 0,
+            'error_rate': round(total_errors / total, 4) if total else 0,
+            'shed_rate': round(total_shed / total, 4) if total else 0,
+            'endpoints': endpoints
+        }
+
+
+class ProcessSampler:
+    """
+    Samples RSS and CPU of gunicorn workers (children of the master) via /proc
+    Linux only; reports None elsewhere
+    """
+
+    def __init__(self, master_pid: int, interval: float = 1.0):
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peak_rss: Dict[int, int] = {}
+        self.cpu_start: Dict[int, float] = {}
+        self.cpu_end: Dict[int, float] = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='sampler', daemon=True)
+        self._clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self.available = os.path.exists(f'/proc/{master_pid}/stat')
+
+    def _workers(self) -> List[int]:
+        pids = []
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat') as f:
+                    fields = f.read().rsplit(')', 1)[1].split()
+                if int(fields[1]) == self.master_pid:
+                    pids.append(int(entry))
+            except (OSError, IndexError, ValueError):
+                continue
+        return pids
+
+    def _sample(self, pid: int) -> Tuple[Optional[int], Optional[float]]:
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            cpu = (int(fields[11]) + int(fields[12])) / self._clock_ticks
+            rss = None
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss = int(line.split()[1]) * 1024
+                        break
+            return rss, cpu
+        except (OSError, IndexError, ValueError):
+            return None, None
+
+    def _run(self):
+        while not self._stop.is_set():
+            for pid in self._workers():
+                rss, cpu = self._sample(pid)
+                if rss is not None:
+                    self.peak_rss[pid] = max(self.peak_rss.get(pid, 0), rss)
+                if cpu is not None:
+                    self.cpu_start.setdefault(pid, cpu)
+                    self.cpu_end[pid] = cpu
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if self.available:
+            self._started = time.monotonic()
+            self._thread.start()
+
+    def stop(self) -> Optional[dict]:
+        if not self.available:
+            return None
+        self._stop.set()
+        self._thread.join()
+        elapsed = time.monotonic() - self._started
+        workers = {}
+        for pid, rss in self.peak_rss.items():
+            cpu = self.cpu_end.get(pid, 0) - self.cpu_start.get(pid, 0)
+            workers[str(pid)] = {
+                'peak_rss_mb': round(rss / 1024 / 1024, 1),
+                'cpu_s': round(cpu, 2),
+                'cpu_pct': round(100 * cpu / elapsed, 1) if elapsed else 0
+            }
+        return {
+            'workers': workers,
+            'max_rss_mb': max((w['peak_rss_mb'] for w in workers.values()), default=0),
+            'total_cpu_s': round(sum(w['cpu_s'] for w in workers.values()), 2)
+        }
+
+
+class LoadDriver:
+    """Closed-loop load generator: `concurrency` threads issuing back-to-back requests"""
+
+    def __init__(self, proxy_base: str, concurrency: int, duration: float,
+                 mix: Optional[Dict[str, int]] = None, origin_host: str = ORIGIN_HOST,
+                 timeout: float = 65, seed: int = 1):
+        self.proxy_base = proxy_base.rstrip('/')
+        self.concurrency = concurrency
+        self.duration = duration
+        self.mix = mix or DEFAULT_MIX
+        self.origin_host = origin_host
+        self.timeout = timeout
+        self.seed = seed
+        self.metrics = Metrics()
+
+    def _build_request(self, endpoint: str, rng: random.Random, worker_id: int) -> Tuple[str, str, dict]:
+        session_id = f'loadtest-{worker_id}'
+        if endpoint == '/proxy':
+            if rng.random() < 0.1:
+                path = f'/redirect?{rng.choice(REDIRECT_VARIANTS)}'
+            else:
+                path = f'/page?{rng.choice(PAGE_VARIANTS)}&seed={rng.randint(0, 50)}'
+            return 'POST', '/proxy', {'json': {'url': f'http://{self.origin_host}{path}', 'sessionId': session_id}}
+        if endpoint == '/resource':
+            asset = rng.choice(ASSET_VARIANTS).format(i=rng.randint(0, 200))
+            url = quote(f'http://{self.origin_host}/asset/{asset}', safe='')
+            return 'GET', f'/resource?url={url}&session={session_id}', {'headers': RESOURCE_HEADERS}
+        return 'POST', '/validate', {'json': {'url': rng.choice(VALIDATE_VARIANTS)}}
+
+    def _worker(self, worker_id: int, deadline: float):
+        rng = random.Random(self.seed * 1000 + worker_id)
+        endpoints = list(self.mix.keys())
+        weights = list(self.mix.values())
+        with requests.Session() as session:
+            # The proxy service itself is local; never route it through HTTP_PROXY
+            session.trust_env = False
+            while time.monotonic() < deadline:
+                endpoint = rng.choices(endpoints, weights)[0]
+                method, path, kwargs = self._build_request(endpoint, rng, worker_id)
+                started = time.perf_counter()
+                status = None
+                size = 0
+                retry_after = None
+                shed = False
+                try:
+                    response = session.request(method, self.proxy_base + path, timeout=self.timeout, **kwargs)
+                    size = len(response.content)
+                    status = response.status_code
+                    if status == 503:
+                        retry_after = response.headers.get('Retry-After')
+                        # Circuit-open/negative-cache 503s also carry Retry-After but are upstream errors
+                        shed = retry_after is not None and 'X-Elara-Fail-Fast' not in response.headers
+                except requests.RequestException as e:
+                    logger.debug(f"{endpoint} failed: {e}")
+                self.metrics.record(endpoint, time.perf_counter() - started, status, size, shed=shed)
+                if retry_after is not None:
+                    # Back off like a well-behaved client instead of hammering a shedding proxy
+                    try:
+                        time.sleep(max(0.0, min(float(retry_after), deadline - time.monotonic())))
+                    except ValueError:
+                        pass
+
+    def run(self) -> dict:
+        deadline = time.monotonic() + self.duration
+        threads = [
+            threading.Thread(target=self._worker, args=(i, deadline), name=f'load-{i}', daemon=True)
+            for i in range(self.concurrency)
+        ]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.metrics.summary(time.monotonic() - started)
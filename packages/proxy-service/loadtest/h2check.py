@@ -0,0 +1,117 @@
+"""
+Elara Proxy Load Test - HTTP/2 multiplexing check
+Proves that concurrent /resource fetches share one h2 connection upstream
+
+Starts the origin simulator with --tls (self-signed cert, h2 via ALPN) and
+the proxy with UPSTREAM_HTTP2=true, HTTPS_PROXY pointing at the simulator and
+UPSTREAM_TLS_VERIFY set to the simulator's certificate. Slow https:// assets
+are then fetched concurrently through /resource and both ends are checked:
+/debug/upstream must report HTTP/2 with peakStreams > 1 over a single pooled
+connection, and the origin must have seen more than one stream in flight on
+that connection.
+
+Usage (from packages/proxy-service):
+    python -m loadtest.h2check --concurrency 8
+
+Exit code is 1 when any check fails.
+"""
+
+import sys
+import json
+import logging
+import shutil
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from urllib.parse import quote
+
+import requests
+
+from loadtest.origin import ORIGIN_HOST
+from loadtest.run import free_port, start_origin, start_proxy, stop_process, wait_healthy
+
+logger = logging.getLogger(__name__)
+
+
+def check_multiplexing(upstream: dict, origin_stats: dict, origin: str) -> List[str]:
+    """Return human-readable failures for the proxy's and the origin's view of the run"""
+    failures = []
+    stats = upstream.get('origins', {}).get(origin)
+    if upstream.get('transport') != 'h2':
+        failures.append(f"proxy transport is {upstream.get('transport')}, expected h2")
+    if not stats:
+        failures.append(f"no stream stats for {origin}")
+    else:
+        if stats['httpVersion'] != 'HTTP/2':
+            failures.append(f"{origin} negotiated {stats['httpVersion']}, expected HTTP/2")
+        if stats['peakStreams'] <= 1:
+            failures.append(f"{origin} peakStreams {stats['peakStreams']}, expected > 1")
+
+    connections = upstream.get('connections', [])
+    if len(connections) != 1 or 'HTTP/2' not in connections[0]:
+        failures.append(f"expected exactly one pooled HTTP/2 connection, got {connections}")
+
+    h2_connections = origin_stats.get('h2Connections', [])
+    if len(h2_connections) != 1:
+        failures.append(f"origin accepted {len(h2_connections)} h2 connections, expected 1")
+    elif h2_connections[0]['peakConcurrentStreams'] <= 1:
+        failures.append(f"origin saw at most {h2_connections[0]['peakConcurrentStreams']} "
+                        f"concurrent streams on its connection, expected > 1")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Check HTTP/2 multiplexing of /resource fetches')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=0.5, help='origin response delay per asset (s)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    cert_dir = tempfile.mkdtemp(prefix='elara-origin-tls-')
+    blob_dir = tempfile.mkdtemp(prefix='elara-loadtest-blobs-')
+    origin_port = free_port()
+    proxy_port = free_port()
+    base_url = f'http://127.0.0.1:{proxy_port}'
+    origin_proc = start_origin(origin_port, '--tls', '--cert-dir', cert_dir)
+    proxy_proc = start_proxy(proxy_port, origin_port, workers=1, threads=max(4, args.concurrency * 2), env_overrides={
+        'UPSTREAM_HTTP2': 'true',
+        'UPSTREAM_TLS_VERIFY': f'{cert_dir}/origin-cert.pem',
+        'HTTPS_PROXY': f'http://127.0.0.1:{origin_port}',
+        'https_proxy': f'http://127.0.0.1:{origin_port}',
+        'RATE_LIMIT_ENABLED': 'false',
+        # Every fetch must be in flight at once, none shed
+        'ADMISSION_MAX_IN_FLIGHT': str(args.concurrency * 2),
+    }, blob_dir=blob_dir)
+    try:
+        wait_healthy(base_url, proxy_proc)
+
+        def fetch(i: int) -> int:
+            url = f'https://{ORIGIN_HOST}/slow?delay={args.delay}&n={i}'
+            return requests.get(f'{base_url}/resource?url={quote(url, safe="")}', timeout=30).status_code
+
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            statuses = list(pool.map(fetch, range(args.concurrency)))
+
+        upstream = requests.get(f'{base_url}/debug/upstream', timeout=5).json()
+        origin_stats = requests.get(f'http://127.0.0.1:{origin_port}/origin-stats', timeout=5).json()
+        print(json.dumps({'statuses': statuses, 'upstream': upstream, 'origin': origin_stats}, indent=2))
+
+        failures = [f"{statuses.count(200)}/{len(statuses)} fetches returned 200"] if set(statuses) != {200} else []
+        failures += check_multiplexing(upstream, origin_stats, f'https://{ORIGIN_HOST}')
+    finally:
+        stop_process(proxy_proc)
+        stop_process(origin_proc)
+        shutil.rmtree(blob_dir, ignore_errors=True)
+        shutil.rmtree(cert_dir, ignore_errors=True)
+
+    for failure in failures:
+        logger.error(f"FAIL: {failure}")
+    if not failures:
+        logger.info("PASS: concurrent /resource fetches were multiplexed over one HTTP/2 connection")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
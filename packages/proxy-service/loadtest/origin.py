@@ -0,0 +1,448 @@
+"""
+Elara Proxy Load Test - Local origin simulator
+Serves configurable pages and assets so the proxy can be exercised offline
+
+The proxy refuses loopback/private targets, so the simulator is reached as
+an HTTP forward proxy: the proxy service is started with HTTP_PROXY pointing
+here and fetches http://<ORIGIN_HOST>/... URLs, which arrive as absolute-form
+requests. Plain path requests work too, for poking at it with curl.
+
+With --tls the simulator also accepts CONNECT, terminates TLS with a
+self-signed certificate for ORIGIN_HOST and serves https:// URLs over h2 or
+HTTP/1.1 (ALPN), so the proxy's HTTP/2 transport can be tested offline.
+
+Routes (all sizes in bytes):
+    /page?size=&charset=&encoding=&chunked=&drip=&subresources=
+    /asset/<name>.<css|js|svg|png|woff2>?size=&encoding=
+    /redirect?hops=&to=
+    /slow?delay=
+    /origin-stats    per h2 connection stream counts (JSON)
+"""
+
+import os
+import ssl
+import gzip
+import json
+import math
+import time
+import zlib
+import socket
+import select
+import struct
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import brotli
+import h2.config
+import h2.events
+import h2.connection
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ORIGIN_HOST = 'origin.loadtest.example'
+
+ASSET_TYPES = {
+    'css': 'text/css',
+    'js': 'application/javascript',
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+    'woff2': 'font/woff2',
+}
+
+FILLER_WORDS = ['elara', 'proxy', 'secure', 'browser', 'isolation', 'origin', 'asset', 'página', 'naïve', '数据']
+
+
+def compress(body: bytes, encoding: str) -> Tuple[bytes, Optional[str]]:
+    """Apply a Content-Encoding, returning (body, header value)"""
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6), 'gzip'
+    if encoding == 'br':
+        return brotli.compress(body, quality=5), 'br'
+    if encoding == 'zstd' and zstandard is not None:
+        return zstandard.ZstdCompressor().compress(body), 'zstd'
+    return body, None
+
+
+def filler_text(size: int, seed: int) -> str:
+    """Deterministic pseudo-text of roughly `size` characters"""
+    rng = random.Random(seed)
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(FILLER_WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)[:size]
+
+
+def build_page(size: int, subresources: int, host: str) -> str:
+    """HTML page referencing `subresources` assets of each kind"""
+    links = []
+    for i in range(subresources):
+        links.append(f'<link rel="stylesheet" href="http://{host}/asset/style{i}.css?size=4096">')
+        links.append(f'<script src="http://{host}/asset/app{i}.js?size=16384"></script>')
+        links.append(f'<img src="http://{host}/asset/img{i}.png?size=32768">')
+    head = (
+        '<!DOCTYPE html><html><head><meta charset="{charset}"><title>Load test</title>'
+        + ''.join(links)
+        + '<style>body{background:url(/asset/bg.png?size=2048)}</style></head><body>'
+    )
+    tail = '</body></html>'
+    body_size = max(0, size - len(head) - len(tail))
+    paragraphs = []
+    remaining = body_size
+    seed = 0
+    while remaining > 0:
+        text = filler_text(min(remaining, 1024), seed)
+        paragraphs.append(f'<p><a href="/page?seed={seed}">{text}</a></p>')
+        remaining -= len(text) + 30
+        seed += 1
+    return head + ''.join(paragraphs) + tail
+
+
+def build_png(size: int) -> bytes:
+    """Decodable RGB PNG of roughly `size` raw pixel bytes (photo-like gradient + noise)"""
+    side = max(1, int(math.sqrt(size / 3)))
+    rng = random.Random(size)
+    rows = []
+    for y in range(side):
+        row = bytearray([0])  # filter type: none
+        for x in range(side):
+            noise = rng.randrange(32)
+            row += bytes(((x * 255 // side + noise) & 255, (y * 255 // side + noise) & 255, (x ^ y) & 255))
+        rows.append(bytes(row))
+
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data))
+
+    header = struct.pack('>IIBBBBB', side, side, 8, 2, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+            + chunk(b'IDAT', zlib.compress(b''.join(rows), 6)) + chunk(b'IEND', b''))
+
+
+def build_asset(kind: str, size: int) -> bytes:
+    """Asset body of the given kind and approximate size"""
+    if kind == 'css':
+        rules = []
+        i = 0
+        while sum(len(r) for r in rules) < size:
+            rules.append(f'.c{i}{{background:url("../img/i{i}.png");margin:{i % 16}px}}\n')
+            i += 1
+        return ('@import "base.css";\n' + ''.join(rules) + '/*# sourceMappingURL=style.css.map */\n').encode()
+    if kind == 'js':
+        body = f'// {filler_text(size, size)}\nconsole.log("loaded");\n//# sourceMappingURL=app.js.map\n'
+        return body.encode()
+    if kind == 'svg':
+        uses = ''.join(f'<use href="sprite.svg#i{i}"/>' for i in range(max(1, size // 40)))
+        return f'<svg xmlns="http://www.w3.org/2000/svg">{uses}</svg>'.encode()
+    if kind == 'png':
+        return build_png(size)
+    # Fonts: incompressible bytes
+    return random.Random(size).randbytes(size)
+
+
+class OriginRoutes:
+    """Route table shared by the HTTP/1.1 handler and HTTP/2 streams"""
+
+    def send_body(self, body: bytes, content_type: str, params: Dict[str, str],
+                  status: int = 200, headers: Optional[Dict[str, str]] = None):
+        raise NotImplementedError
+
+    def route(self, path: str, params: Dict[str, str], host: str):
+        if path == '/page' or path == '/':
+            self.serve_page(params, host)
+        elif path.startswith('/asset/'):
+            self.serve_asset(path, params)
+        elif path == '/redirect':
+            self.serve_redirect(params, host)
+        elif path == '/slow':
+            time.sleep(float(params.get('delay', '1')))
+            self.send_body(b'slow', 'text/plain', params)
+        elif path == '/origin-stats':
+            body = json.dumps({'h2Connections': H2OriginConnection.all_stats()}).encode()
+            self.send_body(body, 'application/json', {})
+        else:
+            self.send_body(b'not found', 'text/plain', params, status=404)
+
+    def serve_page(self, params: Dict[str, str], host: str):
+        size = int(params.get('size', '50000'))
+        charset = params.get('charset', 'utf-8')
+        subresources = int(params.get('subresources', '10'))
+        html = build_page(size, subresources, host).replace('{charset}', charset)
+        self.send_body(html.encode(charset, errors='xmlcharrefreplace'), f'text/html; charset={charset}', params)
+
+    def serve_asset(self, path: str, params: Dict[str, str]):
+        kind = path.rsplit('.', 1)[-1]
+        if kind not in ASSET_TYPES:
+            self.send_body(b'unknown asset type', 'text/plain', params, status=404)
+            return
+        body = build_asset(kind, int(params.get('size', '8192')))
+        self.send_body(body, ASSET_TYPES[kind], params, headers={'Cache-Control': 'public, max-age=3600'})
+
+    def serve_redirect(self, params: Dict[str, str], host: str):
+        hops = int(params.get('hops', '1'))
+        target = params.get('to', '/page')
+        location = f'http://{host}/redirect?hops={hops - 1}&to={target}' if hops > 1 else f'http://{host}{target}'
+        self.send_body(b'', 'text/plain', {}, status=302, headers={'Location': location})
+
+
+class OriginHandler(OriginRoutes, BaseHTTPRequestHandler):
+    """HTTP/1.1 request handler for the simulated origin"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'ElaraOrigin/1.0'
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        # Absolute-form when we're reached as a forward proxy
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        host = parsed.netloc or self.headers.get('Host', ORIGIN_HOST)
+
+        try:
+            self.route(parsed.path, params, host)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def do_CONNECT(self):
+        """https:// fetches through the forward proxy: terminate TLS ourselves and act as the origin"""
+        tls_context = getattr(self.server, 'tls_context', None)
+        if tls_context is None:
+            self.send_body(b'TLS not enabled (start with --tls)', 'text/plain', {}, status=405)
+            return
+        self.send_response(200, 'Connection established')
+        self.end_headers()
+        self.close_connection = True
+
+        try:
+            tls_sock = tls_context.wrap_socket(self.connection, server_side=True)
+        except (ssl.SSLError, OSError) as e:
+            logger.debug(f"TLS handshake failed: {e}")
+            return
+        try:
+            if tls_sock.selected_alpn_protocol() == 'h2':
+                H2OriginConnection(tls_sock).serve()
+            else:
+                OriginHandler(tls_sock, self.client_address, self.server)
+        except (BrokenPipeError, ConnectionResetError, ssl.SSLError):
+            pass
+        finally:
+            tls_sock.close()
+
+    def send_body(self, body: bytes, content_type: str, params: Dict[str, str],
+                  status: int = 200, headers: Optional[Dict[str, str]] = None):
+        """Send a body honouring encoding=, chunked= and drip= parameters"""
+        body, content_encoding = compress(body, params.get('encoding', 'identity'))
+        chunked = params.get('chunked') == '1'
+        drip_ms = float(params.get('drip', '0'))
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if content_encoding:
+            self.send_header('Content-Encoding', content_encoding)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if chunked or drip_ms:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if not (chunked or drip_ms):
+            self.wfile.write(body)
+            return
+
+        piece = 8192 if not drip_ms else 1024
+        for i in range(0, len(body), piece):
+            chunk = body[i:i + piece]
+            self.wfile.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+            if drip_ms:
+                self.wfile.flush()
+                time.sleep(drip_ms / 1000)
+        self.wfile.write(b'0\r\n\r\n')
+
+
+class H2Stream(OriginRoutes):
+    """One HTTP/2 request, answered on its own thread"""
+
+    def __init__(self, connection: 'H2OriginConnection', stream_id: int):
+        self.connection = connection
+        self.stream_id = stream_id
+
+    def send_body(self, body: bytes, content_type: str, params: Dict[str, str],
+                  status: int = 200, headers: Optional[Dict[str, str]] = None):
+        """Send a body honouring encoding= and drip= (chunked= is meaningless in h2)"""
+        body, content_encoding = compress(body, params.get('encoding', 'identity'))
+        response_headers = [(':status', str(status)), ('content-type', content_type),
+                            ('content-length', str(len(body)))]
+        if content_encoding:
+            response_headers.append(('content-encoding', content_encoding))
+        response_headers += [(name.lower(), value) for name, value in (headers or {}).items()]
+        drip_ms = float(params.get('drip', '0'))
+        self.connection.respond(self.stream_id, response_headers, body, 1024 if drip_ms else 16384, drip_ms)
+
+
+class H2OriginConnection:
+    """
+    Server side of one TLS connection that negotiated h2
+
+    The socket is only touched by the serving thread; stream threads queue
+    frames on the h2 state machine and wake it up through a socketpair.
+    Concurrent stream counts are recorded so a test can prove that requests
+    really were multiplexed over this one connection.
+    """
+
+    _registry = []
+    _registry_lock = threading.Lock()
+
+    def __init__(self, sock: ssl.SSLSocket):
+        self.sock = sock
+        self.conn = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False, header_encoding='utf-8')
+        )
+        self.cond = threading.Condition()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self.stats = {'streams': 0, 'activeStreams': 0, 'peakConcurrentStreams': 0}
+        with self._registry_lock:
+            self._registry.append(self.stats)
+
+    @classmethod
+    def all_stats(cls) -> list:
+        with cls._registry_lock:
+            return [dict(stats) for stats in cls._registry]
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except OSError:
+            pass
+
+    def serve(self):
+        with self.cond:
+            self.conn.initiate_connection()
+        closing = False
+        try:
+            while not closing:
+                readable = [self.sock] if self.sock.pending() else select.select([self.sock, self._wake_r], [], [])[0]
+                if self._wake_r in readable:
+                    self._wake_r.recv(4096)
+                if self.sock in readable:
+                    data = self.sock.recv(65536)
+                    if not data:
+                        return
+                    with self.cond:
+                        events = self.conn.receive_data(data)
+                        closing = self._handle_events(events)
+                        self.cond.notify_all()
+                with self.cond:
+                    out = self.conn.data_to_send()
+                if out:
+                    self.sock.sendall(out)
+        finally:
+            with self.cond:
+                self.stats['activeStreams'] = 0
+                self.cond.notify_all()
+            self._wake_r.close()
+            self._wake_w.close()
+
+    def _handle_events(self, events) -> bool:
+        """Dispatch h2 events (cond held); True once the client has gone away"""
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self.stats['streams'] += 1
+                self.stats['activeStreams'] += 1
+                self.stats['peakConcurrentStreams'] = max(self.stats['peakConcurrentStreams'],
+                                                          self.stats['activeStreams'])
+                headers = dict(event.headers)
+                threading.Thread(target=self._run_stream, args=(event.stream_id, headers), daemon=True).start()
+            elif isinstance(event, h2.events.DataReceived):
+                self.conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                return True
+        return False
+
+    def _run_stream(self, stream_id: int, headers: Dict[str, str]):
+        parsed = urlparse(headers.get(':path', '/'))
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        try:
+            H2Stream(self, stream_id).route(parsed.path, params, headers.get(':authority', ORIGIN_HOST))
+        except Exception as e:
+            logger.debug(f"h2 stream {stream_id} failed: {e}")
+        finally:
+            with self.cond:
+                self.stats['activeStreams'] = max(0, self.stats['activeStreams'] - 1)
+
+    def respond(self, stream_id: int, headers: list, body: bytes, piece: int, drip_ms: float):
+        with self.cond:
+            self.conn.send_headers(stream_id, headers, end_stream=not body)
+        self._wake()
+        sent = 0
+        while sent < len(body):
+            with self.cond:
+                # Respect HTTP/2 flow control: wait for WINDOW_UPDATEs from the client
+                while self.conn.local_flow_control_window(stream_id) <= 0:
+                    if not self.cond.wait(timeout=30):
+                        raise TimeoutError('flow control window stayed closed')
+                size = min(piece, len(body) - sent, self.conn.max_outbound_frame_size,
+                           self.conn.local_flow_control_window(stream_id))
+                self.conn.send_data(stream_id, body[sent:sent + size], end_stream=sent + size == len(body))
+            sent += size
+            self._wake()
+            if drip_ms:
+                time.sleep(drip_ms / 1000)
+
+
+def generate_certificate(directory: str, host: str = ORIGIN_HOST) -> Tuple[str, str]:
+    """Self-signed certificate for host via the openssl CLI; returns (cert path, key path)"""
+    cert = os.path.join(directory, 'origin-cert.pem')
+    key = os.path.join(directory, 'origin-key.pem')
+    subprocess.run([
+        'openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '2',
+        '-keyout', key, '-out', cert, '-subj', f'/CN={host}',
+        '-addext', f'subjectAltName=DNS:{host}',
+    ], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return cert, key
+
+
+def tls_context(cert: str, key: str) -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    context.set_alpn_protocols(['h2', 'http/1.1'])
+    return context
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Elara proxy load test origin simulator')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--tls', action='store_true',
+                        help='accept CONNECT and serve https:// (h2 or http/1.1 via ALPN) with a self-signed cert')
+    parser.add_argument('--cert-dir', default=None, help='where --tls writes its certificate (default: temp dir)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+    # Certificate first: callers treat the listening port as "ready", CA bundle included
+    context = None
+    if args.tls:
+        cert_path, key_path = generate_certificate(args.cert_dir or tempfile.mkdtemp(prefix='elara-origin-tls-'))
+        context = tls_context(cert_path, key_path)
+        logger.info(f"TLS enabled for {ORIGIN_HOST}, CA bundle: {cert_path}")
+    server = ThreadingHTTPServer((args.host, args.port), OriginHandler)
+    server.daemon_threads = True
+    server.tls_context = context
+    logger.info(f"Origin simulator listening on {args.host}:{args.port}")
+    server.serve_forever()
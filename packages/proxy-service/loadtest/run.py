@@ -0,0 +1,227 @@
+"""
+Elara Proxy Load Test - Offline end-to-end harness
+Starts the origin simulator and the proxy under gunicorn (same entry point
+as the Dockerfile), drives load, and gates on regression thresholds
+
+Usage (from packages/proxy-service):
+    python -m loadtest.run --duration 30 --concurrency 32
+    python -m loadtest.run --thresholds loadtest/thresholds.json --baseline last.json --output now.json
+
+Exit code is 1 when any threshold or baseline regression check fails.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import signal
+import logging
+import argparse
+import shutil
+import tempfile
+import subprocess
+from typing import List, Optional
+
+import requests
+
+from loadtest.origin import ORIGIN_HOST
+from loadtest.driver import LoadDriver, ProcessSampler
+
+logger = logging.getLogger(__name__)
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_listening(port: int, proc: subprocess.Popen, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Origin simulator exited with code {proc.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Origin simulator did not start in time')
+
+
+def start_origin(port: int, *extra_args: str) -> subprocess.Popen:
+    """Run the origin simulator in its own process so it doesn't share the driver's GIL"""
+    cmd = [sys.executable, '-m', 'loadtest.origin', '--port', str(port), *extra_args]
+    proc = subprocess.Popen(cmd, cwd=SERVICE_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_listening(port, proc)
+    return proc
+
+
+def stop_process(proc: subprocess.Popen):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def start_proxy(port: int, origin_port: int, workers: int, threads: int, env_overrides: dict,
+                blob_dir: str) -> subprocess.Popen:
+    """Launch the proxy with the Dockerfile's gunicorn command line; the caller owns blob_dir"""
+    env = os.environ.copy()
+    env.update({
+        'PORT': str(port),
+        'PYTHONUNBUFFERED': '1',
+        # Upstream fetches reach the origin simulator as a forward proxy
+        'HTTP_PROXY': f'http://127.0.0.1:{origin_port}',
+        'http_proxy': f'http://127.0.0.1:{origin_port}',
+        'NO_PROXY': '',
+        'no_proxy': '',
+        'BLOB_STORE_DIR': blob_dir,
+    })
+    env.update(env_overrides)
+
+    cmd = [
+        sys.executable, '-m', 'gunicorn', 'app:app',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--timeout', '60',
+        '--log-level', 'warning',
+    ]
+    logger.info(f"Starting proxy: {' '.join(cmd)}")
+    return subprocess.Popen(cmd, cwd=SERVICE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_healthy(base_url: str, proc: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {proc.returncode}")
+        try:
+            if requests.get(f'{base_url}/health', timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError('Proxy did not become healthy in time')
+
+
+def check_thresholds(report: dict, thresholds: dict) -> List[str]:
+    """Return human-readable failures for absolute thresholds"""
+    failures = []
+    overall = thresholds.get('overall', {})
+    if 'min_rps' in overall and report['rps'] < overall['min_rps']:
+        failures.append(f"overall rps {report['rps']} < {overall['min_rps']}")
+    if 'max_error_rate' in overall and report['error_rate'] > overall['max_error_rate']:
+        failures.append(f"overall error_rate {report['error_rate']} > {overall['max_error_rate']}")
+    if 'max_shed_rate' in overall and report['shed_rate'] > overall['max_shed_rate']:
+        failures.append(f"overall shed_rate {report['shed_rate']} > {overall['max_shed_rate']}")
+
+    for endpoint, limits in thresholds.get('endpoints', {}).items():
+        stats = report['endpoints'].get(endpoint)
+        if not stats:
+            continue
+        for metric in ('p50_ms', 'p90_ms', 'p99_ms', 'error_rate', 'shed_rate'):
+            limit = limits.get(f'max_{metric}')
+            if limit is not None and stats[metric] > limit:
+                failures.append(f"{endpoint} {metric} {stats[metric]} > {limit}")
+
+    workers = thresholds.get('workers', {})
+    process = report.get('process')
+    if process and 'max_rss_mb' in workers and process['max_rss_mb'] > workers['max_rss_mb']:
+        failures.append(f"worker peak RSS {process['max_rss_mb']}MB > {workers['max_rss_mb']}MB")
+    return failures
+
+
+def check_baseline(report: dict, baseline: dict, max_regression: float) -> List[str]:
+    """Return failures where p99 or RPS regressed by more than max_regression vs a previous report"""
+    failures = []
+    if baseline.get('rps') and report['rps'] < baseline['rps'] * (1 - max_regression):
+        failures.append(f"overall rps regressed {baseline['rps']} -> {report['rps']}")
+    for endpoint, stats in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(endpoint)
+        if previous and previous.get('p99_ms') and stats['p99_ms'] > previous['p99_ms'] * (1 + max_regression):
+            failures.append(f"{endpoint} p99 regressed {previous['p99_ms']}ms -> {stats['p99_ms']}ms")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description='Elara proxy offline load test')
+    parser.add_argument('--duration', type=float, default=30, help='Seconds of load per run')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent client connections')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers (Dockerfile: 2)')
+    parser.add_argument('--threads', type=int, default=16, help='gunicorn threads per worker (Dockerfile: 16)')
+    parser.add_argument('--mix', default=None, help='Endpoint weights, e.g. "/proxy=1,/resource=6,/validate=3"')
+    parser.add_argument('--env', action='append', default=[], help='Extra KEY=VALUE for the proxy (repeatable)')
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS, help='Threshold JSON file')
+    parser.add_argument('--baseline', default=None, help='Previous report JSON to compare against')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='Allowed fractional regression vs baseline')
+    parser.add_argument('--output', default=None, help='Write the report JSON here')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
+
+    mix = None
+    if args.mix:
+        mix = {k: int(v) for k, v in (item.split('=') for item in args.mix.split(','))}
+    env_overrides = dict(item.split('=', 1) for item in args.env)
+    # Load tests measure the proxy, not the per-IP limiter (every client is 127.0.0.1)
+    env_overrides.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+    origin_port = free_port()
+    origin = start_origin(origin_port)
+    proxy_port = free_port()
+    proxy_base = f'http://127.0.0.1:{proxy_port}'
+    blob_dir = tempfile.mkdtemp(prefix='elara-loadtest-blobs-')
+    proc = start_proxy(proxy_port, origin_port, args.workers, args.threads, env_overrides, blob_dir)
+
+    try:
+        wait_healthy(proxy_base, proc)
+        sampler = ProcessSampler(proc.pid)
+        sampler.start()
+        driver = LoadDriver(proxy_base, args.concurrency, args.duration, mix=mix, origin_host=ORIGIN_HOST)
+        logger.info(f"Driving load: {args.concurrency} connections for {args.duration}s")
+        report = driver.run()
+        report['process'] = sampler.stop()
+    finally:
+        stop_process(proc)
+        stop_process(origin)
+        shutil.rmtree(blob_dir, ignore_errors=True)
+
+    report['config'] = {
+        'concurrency': args.concurrency,
+        'workers': args.workers,
+        'threads': args.threads,
+        'env': env_overrides
+    }
+
+    failures = []
+    if args.thresholds and os.path.exists(args.thresholds):
+        with open(args.thresholds) as f:
+            failures += check_thresholds(report, json.load(f))
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += check_baseline(report, json.load(f), args.max_regression)
+    report['failures'] = failures
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if failures:
+        for failure in failures:
+            logger.error(f"REGRESSION: {failure}")
+        return 1
+    logger.info("All load test thresholds passed")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,425 @@
+"""
+Elara Proxy - Asset optimization stage
+Bandwidth-saving rewrites for /resource bodies served to the isolation iframe
+
+- Images are downscaled to the client's hinted width and re-encoded (WebP when
+  the client accepts it), trading pixel-perfect fidelity for delivered bytes.
+  Requires Pillow; without it images pass through untouched.
+- CSS and JS get a conservative whitespace/comment minification that never
+  touches string, template or regex literals and keeps newlines in JS (ASI).
+
+Results are cached in the blob store keyed by source digest + parameters, and
+an asset is left alone when the saving falls below a threshold.
+"""
+
+import io
+import re
+import logging
+import threading
+from collections import OrderedDict
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+    IMAGE_OPTIMIZATION_AVAILABLE = True
+except ImportError:
+    Image = ImageOps = None
+    IMAGE_OPTIMIZATION_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Bump when optimized output changes so previously cached variants are not reused
+OPTIMIZE_VERSION = 3
+
+RASTER_TYPES = ('image/jpeg', 'image/jpg', 'image/png', 'image/webp', 'image/gif')
+CSS_TYPES = ('text/css',)
+JS_TYPES = ('javascript', 'ecmascript')
+
+# Refuse to decode anything bigger than this (decompression bombs)
+MAX_IMAGE_PIXELS = 40_000_000
+# Hinted widths are rounded up to this step so variants share cache entries
+WIDTH_STEP = 160
+
+# Remember recent "not worth it" decisions so we don't re-encode on every hit
+SKIP_CACHE_SIZE = 4096
+
+# Request headers that select the optimized variant
+VARY_HEADERS = 'Accept, Save-Data, Sec-CH-DPR, DPR, Sec-CH-Width, Width, Sec-CH-Viewport-Width, Viewport-Width'
+
+JS_REGEX_KEYWORD = re.compile(
+    r'(?:^|[^\w$.])(?:return|typeof|case|do|else|in|instanceof|new|delete|void|throw|yield|await)$'
+)
+JS_REGEX_PRECEDERS = set('(,=:[!&|?{};+-*%<>~^')
+
+
+class OptimizeParams(NamedTuple):
+    """Per-request optimization parameters derived from client hints"""
+
+    max_width: int
+    quality: int
+    webp: bool
+
+    @property
+    def key(self) -> str:
+        if self == MINIFY_PARAMS:
+            return 'min'
+        return f"w{self.max_width}-q{self.quality}-{'webp' if self.webp else 'orig'}"
+
+
+# CSS/JS minification doesn't depend on client hints: one variant per asset
+MINIFY_PARAMS = OptimizeParams(max_width=0, quality=0, webp=False)
+
+
+def _header_float(headers: Mapping[str, str], *names: str) -> Optional[float]:
+    for name in names:
+        value = headers.get(name)
+        if value:
+            try:
+                return float(value.strip('"'))
+            except ValueError:
+                continue
+    return None
+
+
+def params_from_headers(headers: Mapping[str, str], default_max_width: int,
+                        quality: int, save_data_quality: int) -> OptimizeParams:
+    """Build parameters from Accept, Save-Data and DPR/Width/Viewport-Width client hints"""
+    dpr = min(4.0, max(1.0, _header_float(headers, 'Sec-CH-DPR', 'DPR') or 1.0))
+    width = _header_float(headers, 'Sec-CH-Width', 'Width')
+    if width is None:
+        viewport = _header_float(headers, 'Sec-CH-Viewport-Width', 'Viewport-Width')
+        width = viewport * dpr if viewport else None
+
+    max_width = default_max_width
+    if width:
+        max_width = min(default_max_width, max(WIDTH_STEP, int(-(-width // WIDTH_STEP) * WIDTH_STEP)))
+
+    save_data = headers.get('Save-Data', '').lower() == 'on'
+    return OptimizeParams(
+        max_width=max_width,
+        quality=save_data_quality if save_data else quality,
+        webp='image/webp' in headers.get('Accept', '')
+    )
+
+
+def _icc_after_convert(img, icc_profile: Optional[bytes]) -> Optional[bytes]:
+    """A grey or CMYK profile no longer describes the pixels once they're converted to RGB"""
+    return None if img.mode.startswith(('L', 'I', 'F', 'CMYK')) else icc_profile
+
+
+def optimize_image(content: bytes, params: OptimizeParams) -> Optional[Tuple[bytes, str]]:
+    """Downscale and re-encode a raster image; None if it can't be handled"""
+    if not IMAGE_OPTIMIZATION_AVAILABLE:
+        return None
+    try:
+        img = Image.open(io.BytesIO(content))
+        if img.width * img.height > MAX_IMAGE_PIXELS or getattr(img, 'is_animated', False):
+            return None
+        source_format = img.format
+        icc_profile = img.info.get('icc_profile')
+        img.load()
+        # EXIF metadata is not carried over, so bake the orientation into the pixels
+        img = ImageOps.exif_transpose(img)
+    except Exception as e:
+        logger.debug(f"[OPTIMIZE] Not a decodable image: {e}")
+        return None
+
+    if img.width > params.max_width:
+        img.thumbnail((params.max_width, img.height), Image.LANCZOS)
+
+    out = io.BytesIO()
+    has_alpha = img.mode in ('RGBA', 'LA') or 'transparency' in img.info
+    if params.webp:
+        if img.mode not in ('RGB', 'RGBA'):
+            icc_profile = _icc_after_convert(img, icc_profile)
+            img = img.convert('RGBA' if has_alpha else 'RGB')
+        img.save(out, 'WEBP', quality=params.quality, method=4, icc_profile=icc_profile)
+        return out.getvalue(), 'image/webp'
+    if source_format == 'JPEG':
+        if img.mode not in ('RGB', 'L'):
+            icc_profile = _icc_after_convert(img, icc_profile)
+            img = img.convert('RGB')
+        img.save(out, 'JPEG', quality=params.quality, optimize=True, progressive=True,
+                 icc_profile=icc_profile)
+        return out.getvalue(), 'image/jpeg'
+    if source_format == 'PNG':
+        img.save(out, 'PNG', optimize=True, icc_profile=icc_profile)
+        return out.getvalue(), 'image/png'
+    return None
+
+
+def _scan_string(source: str, i: int) -> int:
+    """Index just past the string/template literal starting at i"""
+    quote = source[i]
+    n = len(source)
+    j = i + 1
+    while j < n:
+        ch = source[j]
+        if ch == '\\':
+            j += 2
+            continue
+        if ch == quote:
+            return j + 1
+        if ch == '\n' and quote != '`':
+            return j
+        if quote == '`' and ch == '$' and source.startswith('${', j):
+            # Template expression: skip to the matching brace, honouring nested literals
+            depth = 1
+            j += 2
+            while j < n and depth:
+                ch = source[j]
+                if ch in '"\'`':
+                    j = _scan_string(source, j)
+                    continue
+                if ch == '{':
+                    depth += 1
+                elif ch == '}':
+                    depth -= 1
+                j += 1
+            continue
+        j += 1
+    return n
+
+
+def _scan_regex(source: str, i: int) -> int:
+    """Index just past the regex literal (and flags) starting at i"""
+    n = len(source)
+    j = i + 1
+    in_class = False
+    while j < n:
+        ch = source[j]
+        if ch == '\\':
+            j += 2
+            continue
+        if ch == '\n':
+            return j
+        if ch == '[':
+            in_class = True
+        elif ch == ']':
+            in_class = False
+        elif ch == '/' and not in_class:
+            j += 1
+            break
+        j += 1
+    while j < n and (source[j].isalnum() or source[j] == '_'):
+        j += 1
+    return j
+
+
+def _regex_allowed(last: str) -> bool:
+    """Whether a '/' after the `last` emitted token starts a regex literal"""
+    if not last:
+        return True
+    # Postfix a++ / a-- ends an operand (a regex literal can't be incremented): '/' divides
+    if last.endswith(('++', '--')):
+        return False
+    if last[-1] in JS_REGEX_PRECEDERS:
+        return True
+    return JS_REGEX_KEYWORD.search(last) is not None
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch in '_$\\' or ord(ch) > 127
+
+
+def minify_js(source: str) -> str:
+    """Strip comments and collapse whitespace; literals are copied verbatim"""
+    out = []
+    last = ''
+    pending = ''  # '' / ' ' / '\n'
+    n = len(source)
+    i = 0
+
+    def emit(chunk: str):
+        nonlocal last, pending
+        if pending and last:
+            prev, nxt = last[-1], chunk[0]
+            if pending == '\n' and prev not in '{;,([' and nxt not in '}),]':
+                out.append('\n')
+            elif _is_word(prev) and _is_word(nxt) or (prev == nxt and prev in '+-'):
+                out.append(' ')
+        out.append(chunk)
+        last = chunk
+        pending = ''
+
+    while i < n:
+        ch = source[i]
+        if ch in '"\'`':
+            j = _scan_string(source, i)
+            emit(source[i:j])
+            i = j
+        elif ch == '/' and source.startswith('//', i):
+            j = source.find('\n', i)
+            j = n if j == -1 else j
+            if source.startswith(('//#', '//@'), i):
+                # Source map pragmas must start a line, and nothing may follow on it
+                if out:
+                    out.append('\n')
+                out.append(source[i:j] + '\n')
+                last = '\n'
+                pending = ''
+            i = j
+        elif ch == '/' and source.startswith('/*', i):
+            j = source.find('*/', i + 2)
+            j = n if j == -1 else j + 2
+            comment = source[i:j]
+            if comment.startswith(('/*!', '/*#', '/*@')):
+                emit(comment)
+            elif not pending:
+                pending = '\n' if '\n' in comment else ' '
+            i = j
+        elif ch == '/' and _regex_allowed(last):
+            j = _scan_regex(source, i)
+            emit(source[i:j])
+            i = j
+        elif ch.isspace():
+            j = i
+            while j < n and source[j].isspace():
+                j += 1
+            pending = '\n' if '\n' in source[i:j] or pending == '\n' else ' '
+            i = j
+        else:
+            j = i + 1
+            while j < n and source[j] not in '"\'`/' and not source[j].isspace():
+                j += 1
+            emit(source[i:j])
+            i = j
+
+    return ''.join(out)
+
+
+CSS_TOKEN = re.compile(
+    r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')'  # strings
+    r'|(/\*.*?\*/)'                              # comments
+    r'|(\s+)',                                   # whitespace
+    re.DOTALL
+)
+CSS_TIGHT = set('{};,>')
+
+
+def minify_css(source: str) -> str:
+    """Strip comments (keeping /*! and /*# ones), redundant whitespace and ';' before '}'"""
+    out = []
+    pos = 0
+    pending = False
+    code_last = False
+
+    def emit_code(code: str):
+        # Only code segments are touched, never strings or comments
+        code = code.replace(';}', '}')
+        if code[0] == '}' and code_last and out[-1][-1] == ';':
+            out[-1] = out[-1][:-1]
+            if not out[-1]:
+                out.pop()
+        out.append(code)
+
+    for match in CSS_TOKEN.finditer(source):
+        code = source[pos:match.start()]
+        if code:
+            if pending and out and out[-1][-1] not in CSS_TIGHT and code[0] not in CSS_TIGHT:
+                out.append(' ')
+            emit_code(code)
+            code_last = True
+            pending = False
+        pos = match.end()
+
+        string, comment, _ = match.groups()
+        if string:
+            if pending and out and out[-1][-1] not in CSS_TIGHT:
+                out.append(' ')
+            out.append(string)
+            code_last = False
+            pending = False
+        elif comment and comment.startswith(('/*!', '/*#')):
+            out.append(comment)
+            code_last = False
+            pending = False
+        else:
+            pending = True
+
+    tail = source[pos:]
+    if tail:
+        if pending and out and out[-1][-1] not in CSS_TIGHT and tail[0] not in CSS_TIGHT:
+            out.append(' ')
+        emit_code(tail)
+    return ''.join(out)
+
+
+class AssetOptimizer:
+    """Optimization stage with digest-keyed caching and a minimum-savings threshold"""
+
+    def __init__(self, store=None, min_savings: float = 0.1):
+        self.store = store
+        self.min_savings = min_savings
+        self._skipped: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def handles(content_type: str) -> bool:
+        content_type = (content_type or '').lower()
+        if any(t in content_type for t in CSS_TYPES + JS_TYPES):
+            return True
+        return IMAGE_OPTIMIZATION_AVAILABLE and any(t in content_type for t in RASTER_TYPES)
+
+    @staticmethod
+    def is_image(content_type: str) -> bool:
+        """Whether the optimized variant depends on client hints (responses must Vary)"""
+        return any(t in (content_type or '').lower() for t in RASTER_TYPES)
+
+    def params_for(self, content_type: str, params: OptimizeParams) -> OptimizeParams:
+        return params if self.is_image(content_type) else MINIFY_PARAMS
+
+    @staticmethod
+    def cache_key(digest: str, params: OptimizeParams) -> str:
+        return f"optimized:v{OPTIMIZE_VERSION}:{digest}:{params.key}"
+
+    def lookup(self, digest: str, params: OptimizeParams) -> Optional[Tuple[str, str]]:
+        """(path, content_type) of a cached optimized variant"""
+        if not self.store:
+            return None
+        cached = self.store.get(self.cache_key(digest, params))
+        return (cached[0], cached[1]) if cached else None
+
+    def is_skipped(self, digest: str, params: OptimizeParams) -> bool:
+        with self._lock:
+            return (digest, params.key) in self._skipped
+
+    def _skip(self, digest: str, params: OptimizeParams):
+        with self._lock:
+            self._skipped[(digest, params.key)] = True
+            if len(self._skipped) > SKIP_CACHE_SIZE:
+                self._skipped.popitem(last=False)
+
+    def _transform(self, content: bytes, content_type: str, params: OptimizeParams) -> Optional[Tuple[bytes, str]]:
+        lowered = content_type.lower()
+        if any(t in lowered for t in RASTER_TYPES):
+            return optimize_image(content, params)
+        # surrogateescape round-trips any bytes, whatever the real charset
+        text = content.decode('utf-8', errors='surrogateescape')
+        if any(t in lowered for t in CSS_TYPES):
+            return minify_css(text).encode('utf-8', errors='surrogateescape'), content_type
+        if any(t in lowered for t in JS_TYPES):
+            return minify_js(text).encode('utf-8', errors='surrogateescape'), content_type
+        return None
+
+    def optimize(self, content: bytes, content_type: str, params: OptimizeParams,
+                 digest: str) -> Optional[Tuple[bytes, str]]:
+        """Optimized (body, content_type), or None when not worth serving"""
+        try:
+            result = self._transform(content, content_type, params)
+        except Exception as e:
+            logger.warning(f"[OPTIMIZE] Failed to optimize {content_type} ({digest[:12]}): {e}")
+            result = None
+
+        if not result or len(result[0]) > len(content) * (1 - self.min_savings):
+            self._skip(digest, params)
+            return None
+
+        body, new_type = result
+        logger.info(f"[OPTIMIZE] {content_type} -> {new_type}: {len(content)} -> {len(body)} bytes ({params.key})")
+        if self.store:
+            try:
+                self.store.put(self.cache_key(digest, params), body, new_type)
+            except Exception as e:
+                logger.warning(f"[OPTIMIZE] Failed to cache optimized variant: {e}")
+        return result
@@ -0,0 +1,304 @@
+"""
+Elara Proxy - Shared-memory rate limit storage
+Node-wide counters for Flask-Limiter shared by every gunicorn worker
+
+`memory://` keeps counters per process, so limits are multiplied by the worker
+count. This storage keeps them in a fixed-size counter table in an mmap'd file
+(on /dev/shm where available), so every worker on the node enforces the same
+limit without a network round-trip.
+
+Table layout: the file is split into groups of SLOTS_PER_GROUP fixed-size
+slots. A key hashes to one group and is only ever probed inside it, so a
+single group lock (a threading lock for the threads of this worker plus an
+fcntl byte-range lock for other workers) makes each update atomic.
+
+Each slot holds the current and previous fixed-window counts for one key,
+which is all the sliding-window-counter strategy needs.
+
+Capacity is fixed when the table is created: once all slots of a group are in
+use, a new key takes over the slot whose window ended first, even if that key
+is still counting. Such evictions of live counters are counted and logged;
+size the table with the `keys` URI parameter if they show up.
+
+Register by importing this module, then use storage_uri="shm:///path/to/file?keys=65536".
+"""
+
+import os
+import mmap
+import math
+import time
+import fcntl
+import struct
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from contextlib import contextmanager
+from typing import Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from limits.storage import Storage
+from limits.storage.base import SlidingWindowCounterSupport
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ELRL0001'
+HEADER = struct.Struct('<8sII')  # magic, groups, slots per group
+HEADER_SIZE = 64
+
+# key hash, expiry (s), reserved, window index, current count, previous count
+SLOT = struct.Struct('<QIIqII')
+SLOT_HASH = struct.Struct('<Q')
+SLOTS_PER_GROUP = 16
+GROUP_SIZE = SLOT.size * SLOTS_PER_GROUP
+
+DEFAULT_GROUPS = 4096  # 65536 keys, 2MB
+THREAD_LOCK_STRIPES = 64
+EVICTION_LOG_INTERVAL = 60  # seconds between "table full" warnings per worker
+
+
+def default_path() -> str:
+    """Backing file on tmpfs when available"""
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else '/tmp'
+    return os.path.join(base, 'elara-ratelimit')
+
+
+@lru_cache(maxsize=65536)
+def key_hash(key: str) -> int:
+    # 0 marks an empty slot
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little') or 1
+
+
+class SharedMemoryStorage(Storage, SlidingWindowCounterSupport):
+    """
+    Rate limit storage backed by an mmap'd counter table shared across processes
+    Supports the fixed-window and sliding-window-counter strategies
+    """
+
+    STORAGE_SCHEME = ['shm']
+
+    def __init__(self, uri: Optional[str] = None, wrap_exceptions: bool = False,
+                 groups: int = DEFAULT_GROUPS, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        parsed = urlparse(uri or '')
+        self.path = parsed.path or default_path()
+        keys = parse_qs(parsed.query).get('keys')
+        if keys:
+            groups = math.ceil(int(keys[0]) / SLOTS_PER_GROUP)
+        self.groups = max(1, int(groups))
+        self.capacity = self.groups * SLOTS_PER_GROUP
+        self.size = HEADER_SIZE + self.groups * GROUP_SIZE
+        self._thread_locks = [threading.Lock() for _ in range(THREAD_LOCK_STRIPES)]
+        # Keys pushed out while still inside a window (this worker only)
+        self.live_evictions = 0
+        self._eviction_logged_at = 0.0
+        self._eviction_lock = threading.Lock()
+
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._init_table()
+        self._mm = mmap.mmap(self._fd, self.size)
+
+    @property
+    def base_exceptions(self):
+        return (OSError, ValueError)
+
+    def _init_table(self):
+        """Create or re-create the table; the header lock serialises concurrent workers"""
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, HEADER_SIZE, 0)
+        try:
+            header = os.pread(self._fd, HEADER.size, 0)
+            expected = HEADER.pack(MAGIC, self.groups, SLOTS_PER_GROUP)
+            if header != expected or os.fstat(self._fd).st_size != self.size:
+                logger.info(f"Initializing shared rate limit table at {self.path} ({self.size} bytes)")
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, expected, 0)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, HEADER_SIZE, 0)
+
+    @contextmanager
+    def _group(self, hashed: int):
+        """Lock the key's group across threads and processes; yields the group offset"""
+        group = hashed % self.groups
+        offset = HEADER_SIZE + group * GROUP_SIZE
+        with self._thread_locks[group % THREAD_LOCK_STRIPES]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, GROUP_SIZE, offset)
+            try:
+                yield offset
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, GROUP_SIZE, offset)
+
+    def _find(self, offset: int, hashed: int, now: float, create: bool) -> Optional[int]:
+        """Slot offset for a key within its group, claiming a free/stale slot if create"""
+        mm = self._mm
+        free = None
+        oldest = None
+        oldest_end = None
+        # Start probing at the key's home slot so most lookups hit on the first read
+        home = (hashed // self.groups) % SLOTS_PER_GROUP
+        for i in range(SLOTS_PER_GROUP):
+            slot = offset + ((home + i) % SLOTS_PER_GROUP) * SLOT.size
+            slot_hash = SLOT_HASH.unpack_from(mm, slot)[0]
+            if slot_hash == hashed:
+                return slot
+            if not create:
+                continue
+            if slot_hash == 0:
+                if free is None:
+                    free = slot
+                continue
+            _, expiry, _, window, _, _ = SLOT.unpack_from(mm, slot)
+            # Cleared, or both windows of this key have passed: the slot can be reused
+            if not expiry or window < int(now // expiry) - 1:
+                if free is None:
+                    free = slot
+                continue
+            # Windows of different limits have different lengths: compare when they end
+            end = (window + 1) * expiry
+            if oldest is None or end < oldest_end:
+                oldest, oldest_end = slot, end
+
+        if not create:
+            return None
+        slot = free
+        if slot is None:
+            # Every slot holds a live counter: the one whose window ends first loses it
+            slot = oldest
+            self._evicted_live(now)
+        SLOT.pack_into(mm, slot, hashed, 0, 0, 0, 0, 0)
+        return slot
+
+    def _evicted_live(self, now: float):
+        with self._eviction_lock:
+            self.live_evictions += 1
+            if now - self._eviction_logged_at < EVICTION_LOG_INTERVAL:
+                return
+            self._eviction_logged_at = now
+            logger.warning(
+                f"[RATE-LIMIT] Counter table full ({self.capacity} keys): "
+                f"{self.live_evictions} live counters evicted by this worker, their clients start over"
+            )
+
+    def _read(self, slot: int, expiry: int, now: float) -> Tuple[int, int, int]:
+        """(window, current, previous) for the window containing `now`"""
+        _, _, _, window, current, previous = SLOT.unpack_from(self._mm, slot)
+        now_window = int(now // expiry)
+        if window == now_window:
+            return now_window, current, previous
+        if window == now_window - 1:
+            return now_window, 0, current
+        return now_window, 0, 0
+
+    @staticmethod
+    def _ttls(expiry: int, now: float, previous: int) -> Tuple[float, float]:
+        elapsed = (now / expiry) % 1
+        previous_ttl = (1 - elapsed) * expiry if previous else 0.0
+        current_ttl = (1 - elapsed) * expiry + expiry
+        return previous_ttl, current_ttl
+
+    # Fixed window ---------------------------------------------------------
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        expiry = max(1, int(expiry))
+        hashed = key_hash(key)
+        now = time.time()
+        with self._group(hashed) as offset:
+            slot = self._find(offset, hashed, now, create=True)
+            window, current, previous = self._read(slot, expiry, now)
+            current += amount
+            SLOT.pack_into(self._mm, slot, hashed, expiry, 0, window, current, previous)
+        return current
+
+    def get(self, key: str) -> int:
+        hashed = key_hash(key)
+        now = time.time()
+        with self._group(hashed) as offset:
+            slot = self._find(offset, hashed, now, create=False)
+            if slot is None:
+                return 0
+            expiry = SLOT.unpack_from(self._mm, slot)[1]
+            if not expiry:
+                return 0
+            return self._read(slot, expiry, now)[1]
+
+    def get_expiry(self, key: str) -> float:
+        hashed = key_hash(key)
+        now = time.time()
+        with self._group(hashed) as offset:
+            slot = self._find(offset, hashed, now, create=False)
+            if slot is None:
+                return now
+            expiry = SLOT.unpack_from(self._mm, slot)[1]
+            if not expiry:
+                return now
+            return (int(now // expiry) + 1) * expiry
+
+    def clear(self, key: str) -> None:
+        hashed = key_hash(key)
+        with self._group(hashed) as offset:
+            slot = self._find(offset, hashed, time.time(), create=False)
+            if slot is not None:
+                SLOT.pack_into(self._mm, slot, hashed, 0, 0, 0, 0, 0)
+
+    def stats(self) -> dict:
+        return {
+            'path': self.path,
+            'capacity': self.capacity,
+            'liveEvictions': self.live_evictions
+        }
+
+    def check(self) -> bool:
+        return not self._mm.closed
+
+    def reset(self) -> Optional[int]:
+        """Clear every counter; returns the number of keys that were tracked"""
+        cleared = 0
+        for group in range(self.groups):
+            offset = HEADER_SIZE + group * GROUP_SIZE
+            with self._group(group):
+                for i in range(SLOTS_PER_GROUP):
+                    slot = offset + i * SLOT.size
+                    if SLOT_HASH.unpack_from(self._mm, slot)[0]:
+                        cleared += 1
+                self._mm[offset:offset + GROUP_SIZE] = bytes(GROUP_SIZE)
+        return cleared
+
+    # Sliding window counter -----------------------------------------------
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        # Hot path: checked on every request, so the group lock is inlined
+        if amount > limit:
+            return False
+        expiry = max(1, int(expiry))
+        hashed = key_hash(key)
+        now = time.time()
+        group = hashed % self.groups
+        offset = HEADER_SIZE + group * GROUP_SIZE
+        with self._thread_locks[group % THREAD_LOCK_STRIPES]:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, GROUP_SIZE, offset)
+            try:
+                slot = self._find(offset, hashed, now, create=True)
+                window, current, previous = self._read(slot, expiry, now)
+                previous_ttl = (1 - (now / expiry) % 1) * expiry if previous else 0.0
+                if math.floor(previous * previous_ttl / expiry + current) + amount > limit:
+                    return False
+                SLOT.pack_into(self._mm, slot, hashed, expiry, 0, window, current + amount, previous)
+                return True
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, GROUP_SIZE, offset)
+
+    def get_sliding_window(self, key: str, expiry: int) -> Tuple[int, float, int, float]:
+        expiry = max(1, int(expiry))
+        hashed = key_hash(key)
+        now = time.time()
+        with self._group(hashed) as offset:
+            slot = self._find(offset, hashed, now, create=False)
+            if slot is None:
+                current = previous = 0
+            else:
+                _, current, previous = self._read(slot, expiry, now)
+        previous_ttl, current_ttl = self._ttls(expiry, now, previous)
+        return previous, previous_ttl, current, current_ttl
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        self.clear(key)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Service modules are top-level (app.py, upstream.py, ...), run as `python -m pytest` or `pytest`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
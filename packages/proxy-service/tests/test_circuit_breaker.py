@@ -0,0 +1,81 @@
+"""Per-origin circuit breakers and their memory bounds"""
+
+import pytest
+
+import circuit_breaker
+from circuit_breaker import CLOSED, OPEN, BreakerRegistry, NegativeCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(circuit_breaker.time, 'monotonic', clock)
+    return clock
+
+
+def fail(registry, origin, times):
+    for _ in range(times):
+        registry.record_failure(origin, 'timeout')
+
+
+def test_opens_after_threshold_and_probes_after_reset(clock):
+    registry = BreakerRegistry(failure_threshold=3, reset_timeout=10)
+    fail(registry, 'https://dead.example', 3)
+    assert registry.stats()['origins']['https://dead.example']['state'] == OPEN
+    assert registry.allow('https://dead.example') == pytest.approx(10)
+
+    clock.now += 10
+    assert registry.allow('https://dead.example') is None  # the probe
+    assert registry.allow('https://dead.example') is not None  # everyone else waits for it
+    registry.record_success('https://dead.example')
+    assert registry.stats()['origins']['https://dead.example']['state'] == CLOSED
+
+
+def test_registry_is_capped_least_recently_used_first(clock):
+    registry = BreakerRegistry(failure_threshold=1, max_origins=3)
+    for i in range(3):
+        fail(registry, f'https://{i}.dead.example', 1)
+        clock.now += 1
+    # Still being requested, so kept over origins 1 and 2
+    registry.allow('https://0.dead.example')
+    fail(registry, 'https://3.dead.example', 1)
+
+    stats = registry.stats()
+    assert stats['tracked'] == 3
+    assert stats['evicted'] == 1
+    assert set(stats['origins']) == {'https://0.dead.example', 'https://2.dead.example', 'https://3.dead.example'}
+
+
+def test_random_subdomains_do_not_grow_the_registry_without_bound(clock):
+    registry = BreakerRegistry(failure_threshold=1, max_origins=100)
+    for i in range(5000):
+        fail(registry, f'https://{i}.dead.example', 1)
+    assert registry.stats()['tracked'] == 100
+
+
+def test_idle_open_breakers_are_pruned(clock):
+    registry = BreakerRegistry(failure_threshold=1)
+    fail(registry, 'https://dead.example', 1)
+    assert registry.stats()['open'] == 1
+
+    clock.now += circuit_breaker.IDLE_BREAKER_TTL + circuit_breaker.PRUNE_INTERVAL + 1
+    fail(registry, 'https://other.example', 1)  # pruning runs when a breaker is created
+    assert set(registry.stats()['origins']) == {'https://other.example'}
+
+
+def test_negative_cache_expires_and_is_capped(clock):
+    cache = NegativeCache(ttl=5, max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, key.upper())
+    assert cache.get('a') is None
+    assert cache.get('c') == ('C', 5)
+    clock.now += 5
+    assert cache.get('c') is None
@@ -0,0 +1,120 @@
+"""Total request deadlines must hold while a body read is blocked on the socket"""
+
+import socket
+import threading
+import time
+
+import pytest
+
+from deadlines import Deadline, DeadlineExceeded, read_with_deadline
+from upstream import HTTP2_AVAILABLE, Http2Transport, RequestsTransport
+
+
+class TricklingOrigin:
+    """Sends response headers, then `piece` every `interval` seconds; never finishes the body"""
+
+    def __init__(self, piece: bytes = b'x' * 10, interval: float = 0.25):
+        self.piece = piece
+        self.interval = interval
+        self.server = socket.create_server(('127.0.0.1', 0))
+        self.port = self.server.getsockname()[1]
+        self.stopped = threading.Event()
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.port}/slow'
+
+    def _serve(self):
+        while not self.stopped.is_set():
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._respond, args=(conn,), daemon=True).start()
+
+    def _respond(self, conn):
+        with conn:
+            try:
+                conn.recv(65536)
+                conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 1000000\r\n\r\n')
+                while not self.stopped.is_set():
+                    if self.piece:
+                        conn.sendall(self.piece)
+                    time.sleep(self.interval)
+            except OSError:
+                pass
+
+    def close(self):
+        self.stopped.set()
+        self.server.close()
+
+
+@pytest.fixture
+def trickle():
+    origin = TricklingOrigin()
+    yield origin
+    origin.close()
+
+
+@pytest.fixture
+def silent():
+    origin = TricklingOrigin(piece=b'')
+    yield origin
+    origin.close()
+
+
+TRANSPORTS = [RequestsTransport]
+if HTTP2_AVAILABLE:
+    TRANSPORTS.append(Http2Transport)
+
+
+def read_body(transport_cls, url: str, deadline: Deadline, read_timeout: float = 10) -> float:
+    transport = transport_cls()
+    started = time.monotonic()
+    response = transport.fetch(url, headers={}, cookies={}, timeout=(5, read_timeout))
+    try:
+        with pytest.raises(DeadlineExceeded):
+            read_with_deadline(response.iter_bytes(65536, deadline=deadline), deadline)
+    finally:
+        response.close()
+    return time.monotonic() - started
+
+
+@pytest.mark.parametrize('transport_cls', TRANSPORTS)
+def test_trickling_body_stops_at_deadline(trickle, transport_cls):
+    # Every gap is far below the read timeout, so only the total deadline can stop this
+    elapsed = read_body(transport_cls, trickle.url, Deadline(1.0))
+    assert elapsed < 2.0
+
+
+@pytest.mark.parametrize('transport_cls', TRANSPORTS)
+def test_silent_body_stops_at_deadline(silent, transport_cls):
+    elapsed = read_body(transport_cls, silent.url, Deadline(1.0))
+    assert elapsed < 2.0
+
+
+def test_read_timeout_is_clipped_to_deadline():
+    deadline = Deadline(0.5)
+    assert deadline.read_timeout(10) <= 0.5
+    assert deadline.read_timeout(0.1) == 0.1
+
+
+def test_complete_body_reads_normally():
+    server = socket.create_server(('127.0.0.1', 0))
+    body = b'y' * 200000
+
+    def serve():
+        conn, _ = server.accept()
+        with conn:
+            conn.recv(65536)
+            conn.sendall(b'HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n' % len(body) + body)
+
+    threading.Thread(target=serve, daemon=True).start()
+    try:
+        deadline = Deadline(5)
+        response = RequestsTransport().fetch(f'http://127.0.0.1:{server.getsockname()[1]}/', {}, {}, (5, 5))
+        assert read_with_deadline(response.iter_bytes(65536, deadline=deadline), deadline) == body
+        response.close()
+    finally:
+        server.close()
@@ -0,0 +1,72 @@
+"""CSS/JS minifiers and image re-encoding in optimize.py"""
+
+import io
+
+import pytest
+
+from optimize import IMAGE_OPTIMIZATION_AVAILABLE, OptimizeParams, minify_css, minify_js, optimize_image
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('var  a = 1 ;\n  var b = 2;', 'var a=1;var b=2;'),
+    ('a = b // trailing comment\nc = d', 'a=b\nc=d'),
+    ('/* gone */ x = 1; /*! kept */', 'x=1;/*! kept */'),
+    ('return  a', 'return a'),
+    ('a + +b; c - -d', 'a+ +b;c- -d'),
+    # Literals are copied verbatim
+    ('s = "a  //  b";', 's="a  //  b";'),
+    ("s = 'it\\'s  /*x*/';", "s='it\\'s  /*x*/';"),
+    ('s = `a  ${ b }  c`;', 's=`a  ${ b }  c`;'),
+    ('r = /a  b\\/ [/]  c/g;', 'r=/a  b\\/ [/]  c/g;'),
+    ('if (x) return /a  b/.test(y);', 'if(x)return/a  b/.test(y);'),
+    # '/' after an operand is division, not the start of a regex
+    ('x = a / 2; t = "k  /  m";', 'x=a/2;t="k  /  m";'),
+    ('x = f(a) / 2; t = "k  /  m";', 'x=f(a)/2;t="k  /  m";'),
+    ('x = a++ / 2; t = "k  /  m";', 'x=a++/2;t="k  /  m";'),
+    ('y = x-- / 2; t = "k  /  m";', 'y=x--/2;t="k  /  m";'),
+])
+def test_minify_js(source, expected):
+    assert minify_js(source) == expected
+
+
+def test_minify_js_keeps_source_map_pragma_on_its_own_line():
+    assert minify_js('f();\n//# sourceMappingURL=app.js.map\n') == 'f();\n//# sourceMappingURL=app.js.map\n'
+
+
+def test_minify_js_keeps_line_breaks_that_asi_needs():
+    assert minify_js('a = 1\nb = 2\n') == 'a=1\nb=2'
+
+
+@pytest.mark.parametrize('source, expected', [
+    ('a { color : red ; }', 'a{color : red}'),
+    ('a{color:red;}\n\nb{margin:0;}', 'a{color:red}b{margin:0}'),
+    ('/* gone */ a{x:1} /*! kept */ /*# sourceMappingURL=a.css.map */',
+     'a{x:1}/*! kept *//*# sourceMappingURL=a.css.map */'),
+    ('a, b > c { x: 1 }', 'a,b>c{x: 1}'),
+    # Strings and comments are never rewritten
+    ('a:after{content:";}"}', 'a:after{content:";}"}'),
+    ("a{content:'  ;}  '}", "a{content:'  ;}  '}"),
+    ('/*! a;} */a{;}', '/*! a;} */a{}'),
+    ('a{b:"x";}', 'a{b:"x"}'),
+])
+def test_minify_css(source, expected):
+    assert minify_css(source) == expected
+
+
+@pytest.mark.skipif(not IMAGE_OPTIMIZATION_AVAILABLE, reason='Pillow not installed')
+@pytest.mark.parametrize('webp', [False, True])
+def test_optimize_image_applies_orientation_and_keeps_icc_profile(webp):
+    from PIL import Image, ImageCms
+
+    icc = ImageCms.ImageCmsProfile(ImageCms.createProfile('sRGB')).tobytes()
+    img = Image.new('RGB', (400, 200), 'red')
+    exif = img.getexif()
+    exif[0x0112] = 6  # rotate 90° clockwise when displayed
+    source = io.BytesIO()
+    img.save(source, 'JPEG', exif=exif, icc_profile=icc, quality=95)
+
+    body, content_type = optimize_image(source.getvalue(), OptimizeParams(max_width=100, quality=60, webp=webp))
+    result = Image.open(io.BytesIO(body))
+    assert content_type == ('image/webp' if webp else 'image/jpeg')
+    assert result.size == (100, 200)
+    assert result.info.get('icc_profile') == icc
@@ -0,0 +1,36 @@
+"""/resource error mapping (app.py initialises from the environment at import time)"""
+
+import os
+import tempfile
+from unittest import mock
+
+import pytest
+
+os.environ.setdefault('BLOB_STORE_DIR', tempfile.mkdtemp(prefix='elara-test-blobs-'))
+os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+
+import app  # noqa: E402
+import requests  # noqa: E402
+from upstream import httpx  # noqa: E402
+
+TIMEOUTS = [requests.exceptions.ReadTimeout('read'), requests.exceptions.ConnectTimeout('connect')]
+if httpx is not None:
+    TIMEOUTS += [httpx.ReadTimeout('read'), httpx.ConnectTimeout('connect'), httpx.PoolTimeout('pool')]
+
+
+@pytest.mark.parametrize('exc', TIMEOUTS, ids=lambda exc: f'{type(exc).__module__}.{type(exc).__name__}')
+def test_upstream_timeouts_return_504_for_either_transport(exc):
+    client = app.app.test_client()
+    # One origin per case so failures don't add up to an open circuit breaker
+    url = f'https://{type(exc).__module__}-{type(exc).__name__.lower()}.timeout.example/a.css'
+    with mock.patch.object(app.resource_transport, 'fetch', side_effect=exc):
+        # Closing the response releases its admission slot, as the WSGI server would
+        with client.get('/resource', query_string={'url': url}) as first:
+            pass
+        with client.get('/resource', query_string={'url': url}) as replayed:
+            pass
+
+    assert first.status_code == 504
+    # The negative cache replays the same status without refetching
+    assert replayed.status_code == 504
+    assert replayed.headers['X-Elara-Fail-Fast'] == 'negative-cache'
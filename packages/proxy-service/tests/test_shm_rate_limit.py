@@ -0,0 +1,52 @@
+"""Shared-memory rate limit table sizing and live-counter evictions"""
+
+import pytest
+
+import shm_rate_limit
+from shm_rate_limit import SLOTS_PER_GROUP, SharedMemoryStorage
+
+
+@pytest.fixture
+def table(tmp_path):
+    def make(query=''):
+        return SharedMemoryStorage(f"shm://{tmp_path / 'ratelimit'}{query}")
+    return make
+
+
+def test_table_size_comes_from_the_uri(table):
+    storage = table('?keys=100')
+    assert storage.groups == 7
+    assert storage.capacity == 7 * SLOTS_PER_GROUP
+
+
+def test_live_counters_are_only_evicted_when_the_group_is_full(table, monkeypatch):
+    storage = table(f'?keys={SLOTS_PER_GROUP}')
+    monkeypatch.setattr(shm_rate_limit.time, 'time', lambda: 1000.0)
+
+    for i in range(SLOTS_PER_GROUP):
+        assert storage.acquire_sliding_window_entry(f'client-{i}', 1, 60)
+    assert storage.live_evictions == 0
+    # Still limited while the table has room for them
+    assert not storage.acquire_sliding_window_entry('client-0', 1, 60)
+
+    assert storage.acquire_sliding_window_entry('one-too-many', 1, 60)
+    assert storage.live_evictions == 1
+    assert storage.stats()['liveEvictions'] == 1
+
+
+def test_expired_and_cleared_slots_are_reused_without_eviction(table, monkeypatch):
+    storage = table(f'?keys={SLOTS_PER_GROUP}')
+    now = [1000.0]
+    monkeypatch.setattr(shm_rate_limit.time, 'time', lambda: now[0])
+
+    for i in range(SLOTS_PER_GROUP):
+        storage.incr(f'client-{i}', 60)
+    storage.clear('client-0')
+    storage.incr('newcomer', 60)
+    assert storage.live_evictions == 0
+
+    # Two windows later every counter has expired
+    now[0] += 120
+    for i in range(SLOTS_PER_GROUP):
+        storage.incr(f'other-{i}', 60)
+    assert storage.live_evictions == 0
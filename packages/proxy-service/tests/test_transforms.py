@@ -0,0 +1,29 @@
+"""Streaming transform pipeline output across chunk boundaries"""
+
+import pytest
+
+from transforms import build_pipeline
+
+CSS = 'a { background: url(img/bg.png) } /* é */\n' * 50
+
+
+def stream(pipeline, body: bytes, chunk_size: int) -> bytes:
+    out = b''.join(pipeline.feed(body[i:i + chunk_size]) for i in range(0, len(body), chunk_size))
+    return out + pipeline.flush()
+
+
+@pytest.mark.parametrize('charset', ['utf-8', 'utf-16', 'utf-32', 'latin-1'])
+@pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+def test_streamed_output_matches_one_shot_encoding(charset, chunk_size):
+    pipeline = build_pipeline(f'text/css; charset={charset}', 'https://example.com/css/site.css')
+    out = stream(pipeline, CSS.encode(charset), chunk_size)
+
+    expected = CSS.replace('url(img/bg.png)', 'url("https://example.com/css/img/bg.png")')
+    # Exactly one BOM for the stateful codecs, not one per chunk
+    assert out == expected.encode(charset)
+
+
+def test_undecodable_bytes_pass_through():
+    body = b'a { content: "\x93quoted\x94" } url(x.png)'
+    pipeline = build_pipeline('text/css', 'https://example.com/')
+    assert stream(pipeline, body, 5) == body.replace(b'url(x.png)', b'url("https://example.com/x.png")')
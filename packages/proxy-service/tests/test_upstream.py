@@ -0,0 +1,103 @@
+"""Upstream transport behaviour that the proxy's timeouts depend on"""
+
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from upstream import HTTP2_AVAILABLE, HedgedFetcher, Http2Transport, failure_kind
+
+
+@pytest.fixture
+def silent_tls_origin():
+    """Accepts TCP connections and never answers (not even the TLS handshake)"""
+    server = socket.create_server(('127.0.0.1', 0))
+    accepted = []
+
+    def serve():
+        while True:
+            try:
+                accepted.append(server.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield f'https://127.0.0.1:{server.getsockname()[1]}/'
+    server.close()
+    for conn in accepted:
+        conn.close()
+
+
+@pytest.mark.skipif(not HTTP2_AVAILABLE, reason='httpx[http2] not installed')
+def test_first_requests_to_an_origin_keep_their_own_timeouts(silent_tls_origin):
+    transport = Http2Transport()
+    started = time.monotonic()
+
+    def fetch(_):
+        with pytest.raises(Exception) as info:
+            transport.fetch(silent_tls_origin, {}, {}, timeout=(1, 1))
+        return time.monotonic() - started, failure_kind(info.value)
+
+    with ThreadPoolExecutor(5) as pool:
+        results = list(pool.map(fetch, range(5)))
+
+    # Queued behind the negotiating request, but never serialised past their own budget
+    assert max(elapsed for elapsed, _ in results) < 2.0
+    assert {kind for _, kind in results} == {'timeout'}
+    assert transport.stats()['origins'][silent_tls_origin.rstrip('/')]['activeStreams'] == 0
+    transport.close()
+
+
+class FakeResponse:
+    def close(self):
+        pass
+
+
+class SlowFirstTransport:
+    """Records fetch timeouts; the first (primary) fetch is slow enough to be hedged"""
+
+    name = 'fake'
+
+    def __init__(self):
+        self.timeouts = []
+
+    def fetch(self, url, headers, cookies, timeout):
+        self.timeouts.append(timeout)
+        time.sleep(0.5 if len(self.timeouts) == 1 else 0.01)
+        return FakeResponse()
+
+    def stats(self):
+        return {}
+
+
+def test_hedge_timeout_is_clipped_to_what_is_left_of_the_budget():
+    transport = SlowFirstTransport()
+    HedgedFetcher(transport, default_delay=0.2).fetch('https://example.com/', {}, {}, timeout=(5.0, 1.0))
+
+    primary, hedge = transport.timeouts
+    assert primary == (5.0, 1.0)
+    # Fired ~0.2s in, so the hedge has to finish within the ~0.8s that remain
+    assert hedge[1] <= 0.85
+    assert hedge[0] <= hedge[1]
+
+
+@pytest.mark.skipif(not HTTP2_AVAILABLE, reason='httpx[http2] not installed')
+def test_per_origin_bookkeeping_is_bounded():
+    transport = Http2Transport(max_origins=3)
+    # A first request that failed leaves its negotiation gate behind
+    transport._stream_opened('https://busy.example')
+    for i in range(10):
+        origin = f'https://{i}.random.example'
+        transport._stream_opened(origin)
+        transport._negotiating[origin] = threading.Lock()
+        transport._stream_closed(origin)
+
+    stats = transport.stats()
+    assert len(stats['origins']) == 3
+    assert stats['evicted'] == 8
+    # Origins with open streams are never forgotten
+    assert 'https://busy.example' in stats['origins']
+    assert set(transport._negotiating) <= set(stats['origins'])
+    transport.close()
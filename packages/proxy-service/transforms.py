@@ -0,0 +1,212 @@
+"""
+Elara Proxy - Streaming resource transforms
+MIME-aware rewrite stages for /resource bodies (CSS, SVG, JS source maps)
+
+Each stage consumes decoded text in arbitrary chunks and emits rewritten
+text. Tokens may be split across chunk boundaries, so stages hold back the
+tail of their buffer until they can be sure no partial token is pending.
+Content types without a registered stage never build a pipeline and stay on
+the byte-for-byte passthrough path.
+"""
+
+import re
+import codecs
+import logging
+from typing import List, Optional, Type
+from urllib.parse import urljoin
+
+logger = logging.getLogger(__name__)
+
+# Bump when any stage changes its output so cached transformed bodies are not reused
+TRANSFORM_VERSION = 3
+
+# URL schemes that must never be resolved against the resource URL
+UNREWRITABLE_PREFIXES = ('data:', 'blob:', 'about:', 'javascript:', 'mailto:', '#')
+
+
+def resolve_url(base_url: str, url: str) -> str:
+    """Resolve a reference found inside a resource against the resource URL"""
+    if not url or url.lower().startswith(UNREWRITABLE_PREFIXES):
+        return url
+    return urljoin(base_url, url)
+
+
+class Transform:
+    """
+    Base class for a streaming rewrite stage
+
+    Subclasses set `content_types` (substrings matched against Content-Type),
+    `pattern` and implement `replace()`. `holdback` must be at least as long
+    as the longest token the pattern is expected to rewrite.
+    """
+
+    name = 'base'
+    content_types: tuple = ()
+    needs_decompressed = True
+    holdback = 4096
+    pattern: re.Pattern = None
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self._buffer = ''
+
+    @classmethod
+    def handles(cls, content_type: str) -> bool:
+        content_type = content_type.lower()
+        return any(ct in content_type for ct in cls.content_types)
+
+    def replace(self, match: re.Match) -> str:
+        raise NotImplementedError
+
+    def feed(self, text: str) -> str:
+        """Consume a chunk and return whatever output is safe to emit"""
+        self._buffer += text
+        return self._drain(final=False)
+
+    def flush(self) -> str:
+        """Emit everything still buffered"""
+        return self._drain(final=True)
+
+    def _drain(self, final: bool) -> str:
+        buf = self._buffer
+        # Tokens starting before `cut` are guaranteed to be complete in the buffer
+        cut = len(buf) if final else max(0, len(buf) - self.holdback)
+        if cut == 0:
+            return ''
+
+        out = []
+        pos = 0
+        for match in self.pattern.finditer(buf):
+            if match.start() >= cut:
+                break
+            out.append(buf[pos:match.start()])
+            out.append(self.replace(match))
+            pos = match.end()
+
+        emit_to = max(cut, pos)
+        out.append(buf[pos:emit_to])
+        self._buffer = buf[emit_to:]
+        return ''.join(out)
+
+
+class CSSUrlTransform(Transform):
+    """Rewrite url(...) references in stylesheets to absolute URLs"""
+
+    name = 'css-url'
+    content_types = ('text/css',)
+    pattern = re.compile(r'url\(\s*([\'"]?)([^\'"\)\s]*)\1\s*\)', re.IGNORECASE)
+
+    def replace(self, match: re.Match) -> str:
+        url = match.group(2)
+        if not url or url.lower().startswith(UNREWRITABLE_PREFIXES):
+            return match.group(0)
+        return f'url("{resolve_url(self.base_url, url)}")'
+
+
+class CSSImportTransform(Transform):
+    """Rewrite @import "..." string references in stylesheets"""
+
+    name = 'css-import'
+    content_types = ('text/css',)
+    pattern = re.compile(r'(@import\s+)([\'"])([^\'"]+)\2', re.IGNORECASE)
+
+    def replace(self, match: re.Match) -> str:
+        quote = match.group(2)
+        return f'{match.group(1)}{quote}{resolve_url(self.base_url, match.group(3))}{quote}'
+
+
+class SVGHrefTransform(Transform):
+    """Rewrite href / xlink:href attributes in SVG documents"""
+
+    name = 'svg-href'
+    content_types = ('image/svg+xml',)
+    pattern = re.compile(r'((?:xlink:)?href\s*=\s*)([\'"])([^\'"]*)\2', re.IGNORECASE)
+
+    def replace(self, match: re.Match) -> str:
+        quote = match.group(2)
+        return f'{match.group(1)}{quote}{resolve_url(self.base_url, match.group(3))}{quote}'
+
+
+class SourceMapTransform(Transform):
+    """Rewrite sourceMappingURL comments in scripts and stylesheets"""
+
+    name = 'source-map'
+    content_types = ('javascript', 'ecmascript', 'text/css')
+    pattern = re.compile(r'([#@]\s*sourceMappingURL=)([^\s*]+)')
+
+    def replace(self, match: re.Match) -> str:
+        return f'{match.group(1)}{resolve_url(self.base_url, match.group(2))}'
+
+
+# Registered stages, applied in order
+TRANSFORMS: List[Type[Transform]] = [
+    CSSImportTransform,
+    CSSUrlTransform,
+    SVGHrefTransform,
+    SourceMapTransform,
+]
+
+
+def register_transform(transform_cls: Type[Transform]) -> Type[Transform]:
+    """Register an additional stage (usable as a class decorator)"""
+    TRANSFORMS.append(transform_cls)
+    return transform_cls
+
+
+class TransformPipeline:
+    """
+    Chain of transform stages for one resource body
+
+    Works on bytes: input chunks are decoded incrementally with the resource
+    charset, pushed through every stage, and re-encoded incrementally with the
+    same charset (so stateful codecs like utf-16 write their BOM only once).
+    Bytes that don't decode (mislabelled Latin-1, windows-1252 quotes, ...)
+    ride through as surrogates so untouched content is reproduced byte for byte.
+    """
+
+    def __init__(self, stages: List[Transform], charset: str = 'utf-8'):
+        self.stages = stages
+        self.charset = charset
+        self.needs_decompressed = any(stage.needs_decompressed for stage in stages)
+        self._decoder = codecs.getincrementaldecoder(charset)(errors='surrogateescape')
+        self._encoder = codecs.getincrementalencoder(charset)(errors='surrogateescape')
+
+    @property
+    def names(self) -> List[str]:
+        return [stage.name for stage in self.stages]
+
+    def _run(self, text: str, final: bool) -> str:
+        for stage in self.stages:
+            text = stage.feed(text) if not final else stage.feed(text) + stage.flush()
+        return text
+
+    def feed(self, chunk: bytes) -> bytes:
+        text = self._decoder.decode(chunk)
+        return self._encoder.encode(self._run(text, final=False))
+
+    def flush(self) -> bytes:
+        text = self._decoder.decode(b'', final=True)
+        return self._encoder.encode(self._run(text, final=True), final=True)
+
+    def transform(self, content: bytes) -> bytes:
+        """Run a whole body through the pipeline in one go"""
+        return self.feed(content) + self.flush()
+
+
+def build_pipeline(content_type: str, base_url: str) -> Optional[TransformPipeline]:
+    """Build the pipeline for a Content-Type, or None for passthrough types"""
+    stages = [cls(base_url) for cls in TRANSFORMS if cls.handles(content_type or '')]
+    if not stages:
+        return None
+
+    charset = 'utf-8'
+    charset_match = re.search(r'charset=([^\s;]+)', content_type, re.IGNORECASE)
+    if charset_match:
+        candidate = charset_match.group(1).strip('"\'')
+        try:
+            codecs.lookup(candidate)
+            charset = candidate
+        except LookupError:
+            logger.warning(f"[TRANSFORM] Unknown charset {candidate}, using utf-8")
+
+    return TransformPipeline(stages, charset)
@@ -0,0 +1,531 @@
+"""
+Elara Proxy - Upstream transports for asset fetches
+HTTP/1.1 (requests) and optional multiplexed HTTP/2 (httpx + h2)
+
+Asset-heavy pages hit the same one or two CDN hosts dozens of times. The
+HTTP/2 transport keeps one client for the whole worker, so httpx multiplexes
+concurrent fetches to an origin as streams over a single connection. Origins
+that don't negotiate h2 via ALPN transparently fall back to HTTP/1.1.
+"""
+
+import time
+import socket
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+
+from deadlines import Deadline
+
+logger = logging.getLogger(__name__)
+
+try:
+    import httpx
+    import h2  # noqa: F401 - required for httpx http2=True
+    HTTP2_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTP2_AVAILABLE = False
+
+
+class UpstreamResponse:
+    """Transport-neutral view of an upstream response used by /resource"""
+
+    status_code: int
+    headers: dict
+    url: str
+    http_version: str
+
+    @property
+    def content(self) -> bytes:
+        raise NotImplementedError
+
+    def iter_bytes(self, chunk_size: int, decode_content: bool = True,
+                   deadline: Optional[Deadline] = None) -> Iterator[bytes]:
+        """
+        Body chunks of at most chunk_size bytes
+        With a deadline, chunks are yielded as they arrive and every blocking read
+        is cut short when the deadline passes (DeadlineExceeded)
+        """
+        raise NotImplementedError
+
+    def can_decode(self, content_encoding: str) -> bool:
+        """Whether iter_bytes(decode_content=True) can decode this Content-Encoding"""
+        raise NotImplementedError
+
+    def close(self):
+        raise NotImplementedError
+
+
+class RequestsUpstreamResponse(UpstreamResponse):
+    """UpstreamResponse backed by a streamed requests.Response"""
+
+    def __init__(self, response: requests.Response, read_timeout: Optional[float] = None):
+        self._response = response
+        self._read_timeout = read_timeout
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = response.url
+        self.http_version = 'HTTP/1.1'
+
+    @property
+    def content(self) -> bytes:
+        return self._response.content
+
+    def iter_bytes(self, chunk_size: int, decode_content: bool = True,
+                   deadline: Optional[Deadline] = None) -> Iterator[bytes]:
+        if deadline is None:
+            return self._response.raw.stream(chunk_size, decode_content=decode_content)
+        return self._iter_until(chunk_size, decode_content, deadline)
+
+    def _iter_until(self, chunk_size: int, decode_content: bool, deadline: Deadline) -> Iterator[bytes]:
+        # raw.stream() blocks until a full chunk_size arrives; read1() returns after one
+        # socket read, whose timeout is re-armed with the time left before each call
+        raw = self._response.raw
+        gap = self._read_timeout or deadline.budget
+        while True:
+            connection = raw.connection
+            if connection is not None and connection.sock is not None:
+                connection.sock.settimeout(deadline.read_timeout(gap))
+            try:
+                chunk = raw.read1(chunk_size, decode_content=decode_content)
+            except (urllib3.exceptions.ReadTimeoutError, socket.timeout) as e:
+                deadline.check()
+                raise requests.exceptions.ReadTimeout(e)
+            if not chunk:
+                return
+            yield chunk
+            deadline.check()
+
+    def can_decode(self, content_encoding: str) -> bool:
+        return not content_encoding or content_encoding in urllib3.response.HTTPResponse.CONTENT_DECODERS
+
+    def close(self):
+        self._response.close()
+
+
+class Http2UpstreamResponse(UpstreamResponse):
+    """UpstreamResponse backed by a streamed httpx.Response"""
+
+    def __init__(self, response, on_close, read_timeout: Optional[float] = None):
+        self._response = response
+        self._on_close = on_close
+        self._read_timeout = read_timeout
+        self._closed = False
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.http_version = response.http_version
+
+    @property
+    def content(self) -> bytes:
+        try:
+            return self._response.read()
+        finally:
+            self.close()
+
+    def iter_bytes(self, chunk_size: int, decode_content: bool = True,
+                   deadline: Optional[Deadline] = None) -> Iterator[bytes]:
+        if deadline is None:
+            if decode_content:
+                return self._response.iter_bytes(chunk_size)
+            return self._response.iter_raw(chunk_size)
+        return self._iter_until(decode_content, deadline)
+
+    def _iter_until(self, decode_content: bool, deadline: Deadline) -> Iterator[bytes]:
+        # No chunk size: httpx's chunker would otherwise block until chunk_size bytes arrive
+        chunks = self._response.iter_bytes() if decode_content else self._response.iter_raw()
+        gap = self._read_timeout or deadline.budget
+        # httpcore's h2 reader looks up the read timeout before every socket read, so it
+        # can be clipped per read; its HTTP/1.1 reader fixes it for the whole body, so
+        # there the socket is shut down when the deadline passes instead
+        timeouts = self._response.request.extensions.get('timeout', {})
+        watchdog = None
+        if self.http_version != 'HTTP/2':
+            stream = self._response.extensions.get('network_stream')
+            sock = stream.get_extra_info('socket') if stream is not None else None
+            if sock is not None:
+                watchdog = threading.Timer(max(0.0, deadline.remaining()), _shutdown_socket, args=(sock,))
+                watchdog.daemon = True
+                watchdog.start()
+        try:
+            while True:
+                timeouts['read'] = deadline.read_timeout(gap)
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                except (httpx.ReadTimeout, httpx.ReadError, httpx.RemoteProtocolError):
+                    deadline.check()
+                    raise
+                yield chunk
+                deadline.check()
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+
+    def can_decode(self, content_encoding: str) -> bool:
+        return not content_encoding or content_encoding in httpx._decoders.SUPPORTED_DECODERS
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._response.close()
+        self._on_close()
+
+
+def _shutdown_socket(sock):
+    """Unblock a thread stuck in recv() on sock (close() alone doesn't wake it)"""
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class RequestsTransport:
+    """HTTP/1.1 transport: one requests call per fetch (existing behaviour)"""
+
+    name = 'http/1.1'
+
+    def __init__(self, verify=True):
+        self.verify = verify
+
+    def fetch(self, url: str, headers: Dict[str, str], cookies: Dict[str, str],
+              timeout: Tuple[float, float]) -> UpstreamResponse:
+        """Fetch url with a (connect, read) timeout; the body is left unread"""
+        response = requests.get(
+            url,
+            headers=headers,
+            timeout=timeout,
+            cookies=cookies,
+            allow_redirects=True,
+            verify=self.verify,
+            stream=True
+        )
+        return RequestsUpstreamResponse(response, read_timeout=timeout[1])
+
+    def stats(self) -> dict:
+        return {'transport': self.name}
+
+
+class Http2Transport:
+    """
+    Multiplexed HTTP/2 transport shared by all threads of a worker
+    Tracks active/peak stream counts per origin connection; at most
+    `max_origins` origins are tracked, idle ones are forgotten LRU-first
+    """
+
+    name = 'h2'
+
+    def __init__(self, timeout: float = 30, max_connections: int = 100,
+                 verify=True, max_origins: int = 10000):
+        if not HTTP2_AVAILABLE:
+            raise RuntimeError('HTTP/2 transport requires httpx[http2]')
+
+        # Never persist Set-Cookie across sessions: the client is shared by everyone
+        no_cookies = CookieJar(policy=DefaultCookiePolicy(allowed_domains=[]))
+
+        self.client = httpx.Client(
+            http2=True,
+            verify=verify,
+            timeout=timeout,
+            follow_redirects=True,
+            cookies=no_cookies,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        )
+        self._lock = threading.Lock()
+        self.max_origins = max_origins
+        self.evicted = 0
+        self._origins: 'OrderedDict[str, Dict]' = OrderedDict()
+        self._negotiating: Dict[str, threading.Lock] = {}
+
+    def _origin(self, url: str) -> str:
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+    def _stream_opened(self, origin: str):
+        with self._lock:
+            stats = self._origins.get(origin)
+            if stats is None:
+                self._evict_idle()
+                stats = self._origins[origin] = {
+                    'activeStreams': 0,
+                    'peakStreams': 0,
+                    'totalRequests': 0,
+                    'httpVersion': None
+                }
+            else:
+                self._origins.move_to_end(origin)
+            stats['activeStreams'] += 1
+            stats['totalRequests'] += 1
+            stats['peakStreams'] = max(stats['peakStreams'], stats['activeStreams'])
+
+    def _evict_idle(self):
+        """Forget least recently used origins with no open streams (caller holds _lock)"""
+        while len(self._origins) >= self.max_origins:
+            idle = next((o for o, st in self._origins.items() if st['activeStreams'] == 0), None)
+            if idle is None:
+                break
+            del self._origins[idle]
+            # Nobody can be waiting on the gate: waiters hold an open stream
+            self._negotiating.pop(idle, None)
+            self.evicted += 1
+
+    def _stream_closed(self, origin: str, http_version: Optional[str] = None):
+        with self._lock:
+            stats = self._origins[origin]
+            stats['activeStreams'] -= 1
+            if http_version:
+                stats['httpVersion'] = http_version
+
+    def fetch(self, url: str, headers: Dict[str, str], cookies: Dict[str, str],
+              timeout: Tuple[float, float]) -> UpstreamResponse:
+        """Fetch url with a (connect, read) timeout; the body is left unread"""
+        origin = self._origin(url)
+        connect_timeout, read_timeout = timeout
+        # Connection-level headers are illegal in HTTP/2; httpx manages them itself
+        headers = {k: v for k, v in headers.items() if k.lower() not in ('connection', 'keep-alive')}
+        if cookies:
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in cookies.items())
+
+        self._stream_opened(origin)
+        try:
+            request = self.client.build_request('GET', url, headers=headers, timeout=httpx.Timeout(
+                connect=connect_timeout, read=read_timeout, write=read_timeout, pool=connect_timeout
+            ))
+            response = self._send(origin, request, wait=read_timeout)
+        except Exception:
+            self._stream_closed(origin)
+            raise
+
+        return Http2UpstreamResponse(
+            response,
+            on_close=lambda: self._stream_closed(origin, response.http_version),
+            read_timeout=read_timeout
+        )
+
+    def _send(self, origin: str, request, wait: float) -> 'httpx.Response':
+        """
+        Send a request, letting only one through to an origin until ALPN has run
+        On a cold pool httpcore opens a connection per concurrent request since it
+        can't know yet that they could share one; once the first response shows
+        the negotiated version, h2 requests multiplex over that connection.
+        Waiting for that first response, plus whatever this request then spends
+        on its own, is bounded by its read budget, so a dead origin can't make
+        queued requests time out one after another.
+        """
+        with self._lock:
+            gate = None
+            if self._origins[origin]['httpVersion'] is None:
+                gate = self._negotiating.setdefault(origin, threading.Lock())
+        if gate is not None:
+            started = time.monotonic()
+            if not gate.acquire(timeout=wait):
+                raise httpx.PoolTimeout(f"Timed out waiting for the first response from {origin}", request=request)
+            try:
+                # Time spent queued comes out of this request's own timeouts
+                left = wait - (time.monotonic() - started)
+                if left <= 0:
+                    raise httpx.PoolTimeout(f"Timed out waiting for the first response from {origin}", request=request)
+                request.extensions['timeout'] = {
+                    key: value if value is None else min(value, left)
+                    for key, value in request.extensions['timeout'].items()
+                }
+                with self._lock:
+                    negotiated = self._origins[origin]['httpVersion'] is not None
+                if not negotiated:
+                    response = self.client.send(request, stream=True)
+                    with self._lock:
+                        self._origins[origin]['httpVersion'] = response.http_version
+                        self._negotiating.pop(origin, None)
+                    return response
+            finally:
+                gate.release()
+        return self.client.send(request, stream=True)
+
+    def stats(self) -> dict:
+        """Per-origin stream counts plus httpcore's view of each pooled connection"""
+        with self._lock:
+            origins = {origin: dict(stats) for origin, stats in self._origins.items()}
+            evicted = self.evicted
+
+        # Behind HTTP(S)_PROXY requests go through the mounted proxy transports, not client._transport
+        connections = []
+        for transport in [self.client._transport, *self.client._mounts.values()]:
+            try:
+                connections += [conn.info() for conn in transport._pool.connections]
+            except AttributeError:
+                pass
+
+        return {
+            'transport': self.name,
+            'origins': origins,
+            'maxOrigins': self.max_origins,
+            'evicted': evicted,
+            'connections': connections
+        }
+
+    def close(self):
+        self.client.close()
+
+
+class LatencyTracker:
+    """Rolling window of recent upstream time-to-first-byte samples"""
+
+    def __init__(self, window: int = 512):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class HedgedFetcher:
+    """
+    Hedged fetches for idempotent GETs
+
+    The primary attempt runs on a small pool; if it hasn't produced response
+    headers after a p95-derived delay, a second attempt is fired and whichever
+    answers first wins. The loser is closed as soon as it completes. Hedges are
+    capped by `max_in_flight` so a slow origin can't double our upstream load.
+    """
+
+    def __init__(self, transport, pool_size: int = 32, max_in_flight: int = 8,
+                 default_delay: float = 1.0, min_delay: float = 0.05,
+                 min_samples: int = 20):
+        self.transport = transport
+        self.name = f"{transport.name}+hedged"
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='hedge')
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def hedge_delay(self) -> float:
+        """Delay before hedging: p95 TTFB once we have enough samples"""
+        if len(self.latency) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, self.latency.percentile(95))
+
+    def _timed_fetch(self, url: str, headers: Dict[str, str], cookies: Dict[str, str],
+                     timeout: Tuple[float, float]) -> UpstreamResponse:
+        started = time.monotonic()
+        response = self.transport.fetch(url, headers, cookies, timeout)
+        self.latency.record(time.monotonic() - started)
+        return response
+
+    @staticmethod
+    def _discard(future):
+        if not future.cancelled() and future.exception() is None:
+            future.result().close()
+
+    def fetch(self, url: str, headers: Dict[str, str], cookies: Dict[str, str],
+              timeout: Tuple[float, float]) -> UpstreamResponse:
+        started = time.monotonic()
+        primary = self._executor.submit(self._timed_fetch, url, headers, cookies, timeout)
+        delay = self.hedge_delay()
+
+        # Not worth hedging if the read budget would be gone by the time it fires
+        if delay >= timeout[1] or wait([primary], timeout=delay).done:
+            return primary.result()
+        # The budget (already clipped to the request deadline) started with the primary
+        remaining = timeout[1] - (time.monotonic() - started)
+        if remaining <= 0 or not self._slots.acquire(blocking=False):
+            return primary.result()
+
+        hedge_timeout = (min(timeout[0], remaining), remaining)
+        hedge = self._executor.submit(self._timed_fetch, url, headers, cookies, hedge_timeout)
+        hedge.add_done_callback(lambda _: self._slots.release())
+        with self._lock:
+            self.hedges_fired += 1
+        logger.info(f"[HEDGE] Fired hedge for {url} after {delay * 1000:.0f}ms")
+
+        attempts = [primary, hedge]
+        winner = None
+        for future in as_completed(attempts):
+            if future.exception() is None:
+                winner = future
+                break
+        if winner is None:
+            return primary.result()
+
+        for future in attempts:
+            if future is not winner:
+                future.add_done_callback(self._discard)
+        if winner is hedge:
+            with self._lock:
+                self.hedges_won += 1
+        return winner.result()
+
+    def stats(self) -> dict:
+        p95 = self.latency.percentile(95)
+        stats = self.transport.stats()
+        stats['hedging'] = {
+            'hedgesFired': self.hedges_fired,
+            'hedgesWon': self.hedges_won,
+            'samples': len(self.latency),
+            'p95TtfbMs': round(p95 * 1000, 1) if p95 is not None else None,
+            'hedgeDelayMs': round(self.hedge_delay() * 1000, 1)
+        }
+        return stats
+
+
+# Timeouts raised by either transport (both are answered with 504)
+TIMEOUT_ERRORS: Tuple[type, ...] = (requests.exceptions.Timeout,)
+if httpx is not None:
+    TIMEOUT_ERRORS += (httpx.TimeoutException,)
+
+
+def failure_kind(exc: BaseException) -> Optional[str]:
+    """'timeout', 'ssl' or 'connection' for upstream failures that say the origin is unhealthy"""
+    if isinstance(exc, requests.exceptions.Timeout):
+        return 'timeout'
+    if isinstance(exc, requests.exceptions.SSLError):
+        return 'ssl'
+    if isinstance(exc, requests.exceptions.ConnectionError):
+        return 'connection'
+    if httpx is not None:
+        if isinstance(exc, httpx.TimeoutException):
+            return 'timeout'
+        if isinstance(exc, (httpx.NetworkError, httpx.RemoteProtocolError)):
+            message = str(exc).lower()
+            return 'ssl' if 'ssl' in message or 'certificate' in message else 'connection'
+    return None
+
+
+def create_transport(use_http2: bool, timeout: float = 30, hedging: bool = False, verify=True):
+    """
+    Build the upstream transport, falling back to HTTP/1.1 when h2 is unavailable
+    verify is passed to requests/httpx: True, False or a CA bundle path
+    """
+    transport = RequestsTransport(verify=verify)
+    if use_http2:
+        if HTTP2_AVAILABLE:
+            transport = Http2Transport(timeout=timeout, verify=verify)
+        else:
+            logger.warning("UPSTREAM_HTTP2 requested but httpx[http2] is not installed, using HTTP/1.1")
+    if hedging:
+        return HedgedFetcher(transport)
+    return transport